@@ -0,0 +1,164 @@
+"""Semantic answer cache: reuse an answer() result for a near-duplicate question.
+
+A question hits when its embedding is within `threshold` cosine similarity of a cached
+one asked against the same scope (store fingerprint, k, context budget). Entries expire
+after `ttl` seconds and the least recently used ones are evicted beyond `max_entries`.
+
+With `path`, the cache persists in that directory and is shared by processes using it:
+writes take a file lock, re-read the directory and merge this process's new entries and
+counter increments into it. Lookups only touch memory; hit/miss counters are flushed
+with the next put, every `flush_every` seconds, or on flush(). Entries other processes
+add become visible here at this process's next write.
+"""
+import os, json, time, fcntl, threading
+from typing import Callable, Dict, Optional
+import numpy as np
+
+CACHE_THRESHOLD = float(os.getenv("RAG_CACHE_THRESHOLD", "0.95"))
+CACHE_TTL = float(os.getenv("RAG_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX = int(os.getenv("RAG_CACHE_MAX", "1000"))
+CACHE_FLUSH = float(os.getenv("RAG_CACHE_FLUSH", "30"))
+MEMORY = ":memory:"
+
+class AnswerCache:
+    def __init__(self, path: Optional[str] = None, threshold: float = CACHE_THRESHOLD,
+                 ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX,
+                 clock: Callable[[], float] = time.time, flush_every: float = CACHE_FLUSH):
+        self.path = None if path in (None, MEMORY) else path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._vecs = np.zeros((0, 0), dtype="float32")
+        self._entries = []  # aligned with rows of _vecs
+        self._counters = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._unflushed = dict.fromkeys(self._counters, 0)  # increments not yet on disk
+        self._flushed_at = time.monotonic()
+        if self.path:
+            vecs, entries, counters = self._read()
+            if vecs is not None:
+                self._vecs, self._entries = vecs, entries
+                self._counters.update(counters)
+
+    # -- lookup / insert ---------------------------------------------------
+    def get(self, qv: np.ndarray, scope: str) -> Optional[Dict]:
+        """Cached result for the closest same-scope question, or None."""
+        with self._lock:
+            self._expire()
+            best, sim = -1, -1.0
+            if len(self._entries) and self._vecs.shape[1] == len(qv):
+                sims = self._vecs @ qv
+                for i in np.argsort(-sims):
+                    if sims[i] < self.threshold:
+                        break
+                    if self._entries[i]["scope"] == scope:
+                        best, sim = int(i), float(sims[i])
+                        break
+            if best < 0:
+                self._count(misses=1)
+                return None
+            e = self._entries[best]
+            e["last_used"] = self.clock()
+            self._count(hits=1, saved_seconds=e["seconds"])
+            return {"result": json.loads(json.dumps(e["result"])), "similarity": sim, "question": e["question"]}
+
+    def put(self, qv: np.ndarray, scope: str, question: str, result: Dict, seconds: float):
+        """Remember `result`; `seconds` is what a later hit saves."""
+        with self._lock:
+            qv = np.asarray(qv, dtype="float32")[None, :]
+            if self._vecs.shape[1] != qv.shape[1]:
+                # embedding dimension changed → old entries are incomparable
+                self._vecs, self._entries = np.zeros((0, qv.shape[1]), dtype="float32"), []
+            now = self.clock()
+            self._vecs = np.concatenate([self._vecs, qv], axis=0)
+            self._entries.append({"scope": scope, "question": question, "result": result,
+                                  "seconds": float(seconds), "created": now, "last_used": now})
+            self._trim()
+            self._sync()
+
+    def flush(self):
+        """Write pending counter increments (and merge entries) to `path` now."""
+        with self._lock:
+            if self.path and any(self._unflushed.values()):
+                self._sync()
+
+    def stats(self) -> Dict:
+        c = self._counters
+        n = c["hits"] + c["misses"]
+        return {"entries": len(self._entries), "hits": c["hits"], "misses": c["misses"],
+                "hit_rate": c["hits"] / n if n else 0.0, "saved_seconds": round(c["saved_seconds"], 3),
+                "threshold": self.threshold}
+
+    # -- housekeeping ------------------------------------------------------
+    def _count(self, **inc):
+        for k, v in inc.items():
+            self._counters[k] += v
+            self._unflushed[k] += v
+        if self.path and time.monotonic() - self._flushed_at >= self.flush_every:
+            self._sync()
+
+    def _keep(self, idx):
+        self._vecs = self._vecs[idx] if len(idx) else np.zeros((0, self._vecs.shape[1]), dtype="float32")
+        self._entries = [self._entries[i] for i in idx]
+
+    def _expire(self):
+        cutoff = self.clock() - self.ttl
+        live = [i for i, e in enumerate(self._entries) if e["created"] >= cutoff]
+        if len(live) != len(self._entries):
+            self._keep(live)
+
+    def _trim(self):
+        self._expire()
+        if len(self._entries) > self.max_entries:
+            order = sorted(range(len(self._entries)), key=lambda i: self._entries[i]["last_used"])
+            self._keep(sorted(order[len(self._entries) - self.max_entries:]))
+
+    def _read(self):
+        """(vectors, entries, counters) from `path`; vectors is None if missing/unreadable."""
+        vp, jp = os.path.join(self.path, "vectors.npy"), os.path.join(self.path, "entries.json")
+        if not (os.path.exists(vp) and os.path.exists(jp)):
+            return None, [], {}
+        try:
+            with open(jp, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+            vecs = np.load(vp)
+            if len(vecs) == len(doc["entries"]):
+                return vecs, doc["entries"], doc.get("counters", {})
+        except Exception as e:
+            print(f"[WARN] answer cache unreadable: {e} → starting empty.")
+        return None, [], {}
+
+    def _sync(self):
+        """Merge with what other processes wrote, then write the union back (under a file lock)."""
+        if not self.path:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, ".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            vecs, entries, counters = self._read()
+            if vecs is not None and (not len(self._entries) or vecs.shape[1] == self._vecs.shape[1]):
+                mine = {(e["scope"], e["question"], e["created"]): i for i, e in enumerate(self._entries)}
+                add = [i for i, e in enumerate(entries) if (e["scope"], e["question"], e["created"]) not in mine]
+                for i, e in enumerate(entries):
+                    j = mine.get((e["scope"], e["question"], e["created"]))
+                    if j is not None:
+                        self._entries[j]["last_used"] = max(self._entries[j]["last_used"], e["last_used"])
+                if add:
+                    ours = self._vecs if len(self._entries) else np.zeros((0, vecs.shape[1]), dtype="float32")
+                    self._vecs = np.concatenate([ours, vecs[add]], axis=0)
+                    self._entries += [entries[i] for i in add]
+                self._trim()
+            merged = {k: counters.get(k, 0) + self._unflushed[k] for k in self._counters}
+            tmp = f".tmp-{os.getpid()}"
+            vp, jp = os.path.join(self.path, "vectors.npy"), os.path.join(self.path, "entries.json")
+            with open(vp + tmp, "wb") as f:
+                np.save(f, self._vecs)
+            with open(jp + tmp, "w", encoding="utf-8") as f:
+                json.dump({"entries": self._entries, "counters": merged}, f)
+            os.replace(vp + tmp, vp)
+            os.replace(jp + tmp, jp)
+        self._counters = merged
+        self._unflushed = dict.fromkeys(self._counters, 0)
+        self._flushed_at = time.monotonic()
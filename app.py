@@ -1,24 +1,54 @@
-async function load() {
-  try {
-    const r = await fetch("answers.json", {cache:"no-store"});
-    if (!r.ok) throw new Error("answers.json not found");
-    const data = await r.json();
-
-    document.getElementById("q").textContent = data.question || "(no question)";
-    document.getElementById("ans").textContent = data.result?.answer || "(no answer)";
-
-    const meta = document.getElementById("meta");
-    meta.innerHTML = `<small>Top-K: ${data.top_k ?? "?"}</small>`;
-
-    const list = document.getElementById("srcs");
-    list.innerHTML = "";
-    (data.result?.sources || []).forEach(s => {
-      const li = document.createElement("li");
-      li.textContent = `[${s.rank}] ${s.source} (score ${Number(s.score).toFixed(3)})`;
-      list.appendChild(li);
-    });
-  } catch (e) {
-    document.body.innerHTML = `<p style="color:#f87171">Failed to load answers.json: ${e.message}</p>`;
-  }
-}
-document.addEventListener("DOMContentLoaded", load);
+import os
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from rag import Store, answer, CONTEXT_TOKENS
+from shared_store import SharedStoreClient, POINTER_ENV
+from microbatch import QueryBatcher
+from answer_cache import AnswerCache
+
+STORE_DIR = os.getenv("STORE_DIR", "store")
+
+app = FastAPI(title="LLM RAG Starter API")
+
+# Under `shared_store.py serve` every worker attaches to the parent's shared copy;
+# a plain `uvicorn app:app` loads the store in-process.
+_shared = SharedStoreClient(os.environ[POINTER_ENV]) if os.getenv(POINTER_ENV) else None
+_local = None
+
+def current_store() -> Store:
+    global _local
+    if _shared is not None:
+        return _shared.store()
+    if _local is None:
+        _local = Store.load(STORE_DIR)
+    return _local
+
+# Concurrent /ask requests share one embedding call and one scoring pass
+# (RAG_BATCH_WINDOW_MS / RAG_BATCH_MAX).
+batcher = QueryBatcher(current_store)
+
+# RAG_ANSWER_CACHE=<dir> (persisted; workers merge their entries into it on write and see
+# each other's at their next write) or ":memory:" (per worker) enables the answer cache.
+cache = AnswerCache(os.environ["RAG_ANSWER_CACHE"]) if os.getenv("RAG_ANSWER_CACHE") else None
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await batcher.close()
+    if cache is not None:
+        cache.flush()
+
+@app.get("/health")
+def health():
+    st = current_store()
+    return {"ok": True, "chunks": len(st.meta), "version": st.version,
+            "generation": _shared.generation if _shared else None}
+
+@app.get("/metrics")
+def metrics():
+    return {"batching": batcher.stats(), "answer_cache": cache.stats() if cache else None}
+
+@app.get("/ask")
+async def ask(q: str, k: int = 5, context_tokens: int = CONTEXT_TOKENS):
+    store, qv, hits = await batcher.embed_search(q, k=k)  # answer against the store that was searched
+    return await run_in_threadpool(answer, store, q, k=k, max_context_tokens=context_tokens,
+                                   hits=hits, qv=qv, cache=cache)
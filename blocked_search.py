@@ -0,0 +1,146 @@
+"""Out-of-core top-k search over a segmented store.
+
+`Store.search` needs every vector in RAM and scores them in one (rows × queries) array.
+BlockedSearcher instead memory-maps each segment's .npy file and scores it in blocks of
+`block_rows` rows on a thread pool (the matrix products release the GIL). Each block
+yields only its own top-K per query, merged into one bounded min-heap per query, so peak
+memory is about workers × block_rows × dim floats plus the heaps, whatever the store size.
+Meta JSON is read only for segments that contribute a final hit.
+
+Tombstoned rows are still scored; each heap keeps k + len(tombstones) candidates so the
+deleted ones can be dropped afterwards (`rag.py compact` keeps that number small).
+Segments in the legacy .npz format are read whole, one at a time.
+
+    python blocked_search.py --store store --q "What is RAG?" --block_rows 65536 --workers 8
+"""
+import os, json, time, heapq, argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from rag import Store, SegmentedStore, STORE_DIR_DEFAULT
+
+BLOCK_ROWS = int(os.getenv("RAG_BLOCK_ROWS", "65536"))
+SEARCH_WORKERS = int(os.getenv("RAG_SEARCH_WORKERS", "0")) or (os.cpu_count() or 1)
+
+class BlockedSearcher:
+    """Streams a store's segments block by block; `last_stats` reports the last search's throughput."""
+
+    def __init__(self, store_dir: str = STORE_DIR_DEFAULT, block_rows: int = BLOCK_ROWS,
+                 workers: int = SEARCH_WORKERS):
+        self.seg = SegmentedStore(store_dir)
+        self.block_rows = max(1, block_rows)
+        self.workers = max(1, workers)
+        self.last_stats: Dict = {}
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        return self.search_batch([query], k=k)[0]
+
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[Tuple[float, Dict]]]:
+        man = self.seg.manifest()
+        if not man["segments"]:
+            return [[] for _ in queries]
+        # stores from before the manifest recorded `dim`: take it from the first segment
+        dim = man.get("dim") or self.seg._read_vectors(man["segments"][0], mmap=True).shape[1]
+        # a rows-free Store embeds the queries into the store's space (width, embedder, PCA)
+        space = Store(np.zeros((0, dim), dtype="float32"), [], embed_dim=man.get("embed_dim"),
+                      reducer=self.seg._read_reducer(man), embedder=man.get("embedder"))
+        return self.search_vectors(space.embed(queries), k=k)
+
+    def search_vectors(self, qvs: np.ndarray, k: int = 5, retries: int = 3) -> List[List[Tuple[float, Dict]]]:
+        """Top-k hits for each row of `qvs` (normalized query vectors in the store's space)."""
+        for attempt in range(retries):
+            man = self.seg.manifest()
+            try:
+                return self._search(man, np.ascontiguousarray(qvs, dtype="float32"), k)
+            except FileNotFoundError:
+                # a compaction removed segments of this manifest; search the new one
+                if attempt == retries - 1: raise
+
+    def _search(self, man: Dict, qvs: np.ndarray, k: int) -> List[List[Tuple[float, Dict]]]:
+        if k <= 0:
+            return [[] for _ in range(len(qvs))]
+        keep = k + len(man["tombstones"])
+        heaps: List[list] = [[] for _ in range(len(qvs))]  # (score, segment, row) min-heaps
+        stats = {"rows": 0, "blocks": 0, "bytes": 0}
+        t0 = time.perf_counter()
+
+        def score(si: int, vecs: np.ndarray, start: int):
+            block = np.asarray(vecs[start:start + self.block_rows])  # pages the block in
+            sims = qvs @ block.T  # (nq, block): each query's scores are contiguous
+            if keep < len(block):
+                idx = np.argpartition(-sims, keep - 1, axis=1)[:, :keep]
+                return si, start, idx, np.take_along_axis(sims, idx, axis=1), block.nbytes
+            idx = np.broadcast_to(np.arange(len(block)), sims.shape)
+            return si, start, idx, sims, block.nbytes
+
+        def merge(result):
+            si, start, idx, sims, nbytes = result
+            stats["blocks"] += 1
+            stats["bytes"] += nbytes
+            for j, heap in enumerate(heaps):
+                for row, s in zip(idx[j], sims[j]):
+                    item = (float(s), si, start + int(row))
+                    if len(heap) < keep:
+                        heapq.heappush(heap, item)
+                    elif item > heap[0]:
+                        heapq.heapreplace(heap, item)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for si, seg in enumerate(man["segments"]):
+                vecs = self.seg._read_vectors(seg, mmap=True)
+                self.seg._check_dim(man, vecs, f"segment {seg['name']}")
+                stats["rows"] += len(vecs)
+                # at most one block per worker in flight (plus the one being queued), so
+                # memory stays bounded by the pool rather than the segment
+                pending = []
+                for start in range(0, len(vecs), self.block_rows):
+                    pending.append(pool.submit(score, si, vecs, start))
+                    if len(pending) > self.workers:
+                        merge(pending.pop(0).result())
+                for fut in pending:
+                    merge(fut.result())
+
+        out = self._resolve(man, heaps, k)
+        elapsed = time.perf_counter() - t0
+        self.last_stats = {
+            "queries": len(qvs), "segments": len(man["segments"]), "rows": stats["rows"],
+            "blocks": stats["blocks"], "block_rows": self.block_rows, "workers": self.workers,
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "rows_per_s": round(stats["rows"] / elapsed) if elapsed else None,
+            "mb_per_s": round(stats["bytes"] / elapsed / 1e6, 1) if elapsed else None,
+        }
+        return out
+
+    def _resolve(self, man: Dict, heaps: List[list], k: int) -> List[List[Tuple[float, Dict]]]:
+        """Candidates → (score, meta) hits, reading meta only for segments that have candidates."""
+        metas: Dict[int, List[Dict]] = {}
+        dead: Dict[int, set] = {}
+        for si in sorted({si for heap in heaps for _, si, _ in heap}):
+            metas[si] = self.seg._read_meta(man["segments"][si])
+            dead[si] = self.seg._dead(man, man["segments"][si])
+        out = []
+        for heap in heaps:
+            hits = [(s, metas[si][row]) for s, si, row in sorted(heap, reverse=True)
+                    if metas[si][row]["id"] not in dead[si]]
+            out.append(hits[:k])
+        return out
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(description="Out-of-core blocked search over a segmented store")
+    ap.add_argument("--store", default=os.getenv("STORE_DIR", STORE_DIR_DEFAULT))
+    ap.add_argument("--q", action="append", required=True, help="question (repeat for a batch)")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--block_rows", type=int, default=BLOCK_ROWS)
+    ap.add_argument("--workers", type=int, default=SEARCH_WORKERS)
+    args = ap.parse_args(argv)
+
+    bs = BlockedSearcher(args.store, block_rows=args.block_rows, workers=args.workers)
+    results = bs.search_batch(args.q, k=args.k)
+    print(json.dumps({
+        "results": [{"question": q, "hits": [{"score": s, "source": m["source"], "begin": m["begin"], "end": m["end"]}
+                                            for s, m in hits]} for q, hits in zip(args.q, results)],
+        "stats": bs.last_stats,
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
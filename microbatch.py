@@ -0,0 +1,134 @@
+"""Dynamic micro-batching of concurrent queries.
+
+Requests that arrive within `window_ms` of the first queued one (up to `max_batch`) are
+embedded in one `Store.embed` call and scored with one matrix-matrix product; each
+caller gets its own hits back. While a batch is being scored the next one fills up, so
+batches grow with load and a lone request waits at most one window.
+"""
+import os, time, asyncio
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+import rag
+
+BATCH_WINDOW_MS = float(os.getenv("RAG_BATCH_WINDOW_MS", "5"))
+BATCH_MAX = int(os.getenv("RAG_BATCH_MAX", "32"))
+
+class QueryBatcher:
+    """asyncio front end for query embedding + Store search. Bound to one event loop."""
+
+    def __init__(self, get_store: Callable[[], "rag.Store"], window_ms: float = BATCH_WINDOW_MS,
+                 max_batch: int = BATCH_MAX):
+        self.get_store = get_store
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._queue: "asyncio.Queue | None" = None
+        self._task: "asyncio.Task | None" = None
+        self._stats = {"requests": 0, "batches": 0, "batch_sizes": {}, "queue_delay_ms_sum": 0.0,
+                       "queue_delay_ms_max": 0.0, "score_ms_sum": 0.0}
+
+    async def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
+        return (await self.embed_search(query, k))[2]
+
+    async def embed_search(self, query: str, k: int = 5) -> Tuple["rag.Store", "np.ndarray", List[Tuple[float, Dict]]]:
+        """(store, query vector, top-k hits). Callers that go on to answer should use this store,
+        not get_store() again: a swap in between would mix hits of one store with another's
+        identity (e.g. caching them under the new fingerprint)."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, k, fut, time.perf_counter()))
+        return await fut
+
+    async def close(self):
+        """Stop the batching task; requests still queued or being scored are cancelled."""
+        task, self._task = self._task, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._abort([])
+
+    def _abort(self, batch: list):
+        """Cancel the futures of `batch` and of everything still queued, so no caller hangs."""
+        while self._queue is not None and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        for _, _, fut, _ in batch:
+            if not fut.done():
+                fut.cancel()
+
+    async def _collect(self, batch: list):
+        batch.append(await self._queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.window
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+            # wait_for returns the item if it arrived together with a cancel(), dropping
+            # the cancellation; don't keep looping on a task that was asked to stop.
+            if asyncio.current_task().cancelling():
+                raise asyncio.CancelledError()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                batch = []
+                await self._collect(batch)
+                dispatched = time.perf_counter()
+                try:
+                    results = await loop.run_in_executor(None, self._score, batch)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    for _, _, fut, _ in batch:
+                        if not fut.done():
+                            fut.set_exception(e)
+                    continue
+                score_ms = (time.perf_counter() - dispatched) * 1000
+                for (_, _, fut, _), res in zip(batch, results):
+                    if not fut.done():
+                        fut.set_result(res)
+                self._record(batch, dispatched, score_ms)
+        except asyncio.CancelledError:
+            self._abort(batch)
+            raise
+
+    def _score(self, batch: list) -> list:
+        store = self.get_store()
+        kmax = max(k for _, k, _, _ in batch)
+        qvs = store.embed([q for q, _, _, _ in batch])
+        hits = store.search_vectors(qvs, k=kmax)
+        return [(store, qv, h[:k]) for (_, k, _, _), qv, h in zip(batch, qvs, hits)]
+
+    def _record(self, batch: list, dispatched: float, score_ms: float):
+        st = self._stats
+        st["requests"] += len(batch)
+        st["batches"] += 1
+        st["batch_sizes"][len(batch)] = st["batch_sizes"].get(len(batch), 0) + 1
+        for _, _, _, enqueued in batch:
+            delay = (dispatched - enqueued) * 1000
+            st["queue_delay_ms_sum"] += delay
+            st["queue_delay_ms_max"] = max(st["queue_delay_ms_max"], delay)
+        st["score_ms_sum"] += score_ms
+
+    def stats(self) -> Dict:
+        st = self._stats
+        n, b = st["requests"], st["batches"]
+        return {
+            "window_ms": self.window * 1000, "max_batch": self.max_batch,
+            "requests": n, "batches": b,
+            "avg_batch_size": n / b if b else 0.0,
+            "batch_sizes": dict(sorted(st["batch_sizes"].items())),
+            "avg_queue_delay_ms": st["queue_delay_ms_sum"] / n if n else 0.0,
+            "max_queue_delay_ms": st["queue_delay_ms_max"],
+            "avg_score_ms": st["score_ms_sum"] / b if b else 0.0,
+        }
@@ -1,16 +1,26 @@
-import os, json, argparse, hashlib, re
-import numpy as np
+from __future__ import annotations
+import os, sys, json, argparse, hashlib, re, time, threading, uuid
 from dataclasses import dataclass
-from typing import List, Tuple, Dict
-from pypdf import PdfReader
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Tuple, Dict, Optional
 
-# Optional OpenAI; code works without it (fallback path)
-try:
-    from openai import OpenAI
-except Exception:
-    OpenAI = None
+# numpy is imported inside the functions that use it, so `rag.py ask` answered by the
+# daemon never loads it; this import only serves the annotations.
+if TYPE_CHECKING:
+    import numpy as np
+
+@lru_cache(maxsize=1)
+def _openai_cls():
+    """Optional OpenAI SDK; code works without it (fallback path)."""
+    try:
+        from openai import OpenAI
+        return OpenAI
+    except Exception:
+        return None
 
 EMBED_MODEL = os.getenv("EMBED_MODEL", "text-embedding-3-small")
+EMBED_DIM   = int(os.getenv("EMBED_DIM", "0")) or None  # None → model's native width (384 for the fallback)
+FALLBACK_DIM = 384
 GEN_MODEL   = os.getenv("GEN_MODEL", "gpt-4o-mini")
 
 STORE_DIR_DEFAULT = "store"
@@ -19,117 +29,422 @@ DATA_DIR_DEFAULT  = "data"
 def _normalize_ws(s: str) -> str:
     return re.sub(r"\s+", " ", (s or "").strip())
 
-def _split_chunks(text: str, chunk_size=900, overlap=150) -> List[str]:
-    words = text.split()
-    if not words: return []
-    chunks, i = [], 0
+def _chunk_spans(text: str, chunk_size=900, overlap=150) -> List[Tuple[int,int]]:
+    """Character [begin, end) of each chunk of whitespace-normalized text.
+
+    Chunks are windows of `chunk_size` words; consecutive windows share `overlap` words.
+    """
+    words = text.split(" ")
+    if not text: return []
+    starts, pos = [], 0
+    for w in words:
+        starts.append(pos)
+        pos += len(w) + 1
+    spans, i = [], 0
     step = max(chunk_size - overlap, 1)
     while i < len(words):
-        chunk = " ".join(words[i:i+chunk_size])
-        chunks.append(chunk)
+        j = min(i + chunk_size, len(words)) - 1
+        spans.append((starts[i], starts[j] + len(words[j])))
         i += step
-    return chunks
+    return spans
 
-def _hash_vec(s: str, dim=384) -> np.ndarray:
+def _hash_vec(s: str, dim=FALLBACK_DIM) -> np.ndarray:
     """Deterministic fake embedding so runs work without API key."""
+    import numpy as np
     h = hashlib.sha256(s.encode("utf-8")).digest()
     rs = np.random.RandomState(int.from_bytes(h[:4], "little", signed=False))
     v = rs.rand(dim).astype("float32")
     v = v / (np.linalg.norm(v) + 1e-9)
     return v
 
-def _embed_fallback(texts: List[str]) -> np.ndarray:
-    return np.stack([_hash_vec(t) for t in texts], axis=0) if texts else np.zeros((0,384), dtype="float32")
+def _embed_fallback(texts: List[str], dim: Optional[int] = None) -> np.ndarray:
+    import numpy as np
+    dim = dim or FALLBACK_DIM
+    return np.stack([_hash_vec(t, dim) for t in texts], axis=0) if texts else np.zeros((0,dim), dtype="float32")
+
+HASH_EMBEDDER = "hash"
 
-def _embed_texts(texts: List[str]) -> np.ndarray:
+def _embed_texts(texts: List[str], dim: Optional[int] = None) -> np.ndarray:
     """Try OpenAI; if anything goes wrong, fall back silently."""
-    if not texts:
-        return np.zeros((0,384), dtype="float32")
+    return _embed(texts, dim)[0]
+
+def _embed(texts: List[str], dim: Optional[int] = None) -> Tuple[np.ndarray, str]:
+    """Embeddings plus the identity of the embedder that produced them ("openai:<model>" or "hash").
 
+    `dim` asks for shortened embeddings: text-embedding-3 models return them natively
+    (the `dimensions` parameter, Matryoshka-style); the fallback generates that width.
+    """
+    import numpy as np
     use = os.getenv("USE_OPENAI", "auto").lower()
     key = os.getenv("OPENAI_API_KEY", "").strip()
 
+    if not texts:
+        ident = HASH_EMBEDDER if (use in ("never", "false", "0") or not key) else f"openai:{EMBED_MODEL}"
+        return np.zeros((0, dim or FALLBACK_DIM), dtype="float32"), ident
+
     if use in ("never", "false", "0"):
-        return _embed_fallback(texts)
+        return _embed_fallback(texts, dim), HASH_EMBEDDER
 
-    if OpenAI and key:
+    if key and _openai_cls():
         try:
-            client = OpenAI()  # reads key from env
-            resp = client.embeddings.create(model=EMBED_MODEL, input=texts)
+            client = _openai_cls()()  # reads key from env
+            extra = {"dimensions": dim} if (dim and EMBED_MODEL.startswith("text-embedding-3")) else {}
+            resp = client.embeddings.create(model=EMBED_MODEL, input=texts, **extra)
             vecs = np.array([np.array(e.embedding, dtype="float32") for e in resp.data])
             norms = np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-9
-            return vecs / norms
+            return vecs / norms, f"openai:{EMBED_MODEL}"
         except Exception as e:
             print(f"[WARN] OpenAI embeddings failed: {e} → falling back.")
-            return _embed_fallback(texts)
+            return _embed_fallback(texts, dim), HASH_EMBEDDER
 
     # No SDK or no key → fallback
-    return _embed_fallback(texts)
+    return _embed_fallback(texts, dim), HASH_EMBEDDER
+
+def _fit_pca(vecs: np.ndarray, dim: int) -> Dict:
+    """PCA on the corpus embeddings → {"mean", "components"}; keeps at most rank-many components."""
+    import numpy as np
+    mean = vecs.mean(axis=0)
+    _, _, vt = np.linalg.svd(vecs - mean, full_matrices=False)
+    return {"mean": mean.astype("float32"), "components": vt[:dim].T.astype("float32")}
+
+def _project(vecs: np.ndarray, reducer: Dict) -> np.ndarray:
+    import numpy as np
+    out = (vecs - reducer["mean"]) @ reducer["components"]
+    return (out / (np.linalg.norm(out, axis=1, keepdims=True) + 1e-9)).astype("float32")
 
 @dataclass
 class Store:
     vectors: np.ndarray
     meta: List[Dict]
+    version: int = 0  # manifest version the snapshot was read from (0 = legacy layout)
+    embed_dim: Optional[int] = None  # width requested from the embedder (None → stored width)
+    reducer: Optional[Dict] = None   # PCA fitted at ingest; queries are projected the same way
+    embedder: Optional[str] = None   # "openai:<model>" / "hash"; None for stores that predate it
+    fingerprint: Optional[str] = None  # content identity of the snapshot (see _manifest_fingerprint)
 
     @classmethod
     def load(cls, path: str) -> "Store":
+        import numpy as np
         os.makedirs(path, exist_ok=True)
+        if os.path.exists(os.path.join(path, MANIFEST)):
+            return SegmentedStore(path).load()
         vec_path = os.path.join(path, "vectors.npz")
         meta_path = os.path.join(path, "meta.json")
         if not (os.path.exists(vec_path) and os.path.exists(meta_path)):
-            return cls(np.zeros((0,384), dtype="float32"), [])
+            return cls(np.zeros((0, EMBED_DIM or FALLBACK_DIM), dtype="float32"), [])
         arr = np.load(vec_path)["arr_0"]
         with open(meta_path, "r", encoding="utf-8") as f:
             meta = json.load(f)
-        return cls(arr, meta)
+        sig = repr((os.path.abspath(path), _store_signature(path))).encode("utf-8")
+        return cls(arr, meta, fingerprint=hashlib.sha1(sig).hexdigest()[:16])
 
     def save(self, path: str):
-        os.makedirs(path, exist_ok=True)
-        np.savez_compressed(os.path.join(path, "vectors.npz"), self.vectors)
-        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
-            json.dump(self.meta, f, indent=2)
+        """Full rewrite: publish the store as a single fresh segment."""
+        man = SegmentedStore(path).replace(self.vectors, self.meta, embed_dim=self.embed_dim,
+                                           reducer=self.reducer, embedder=self.embedder)
+        self.version = man["version"]
+        self.fingerprint = _manifest_fingerprint(path, man)
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts (queries or new chunks) into this store's vector space."""
+        raw_dim = self.embed_dim or (None if self.reducer is not None else self.dim)
+        vecs, embedder = _embed(texts, dim=raw_dim)
+        if self.embedder and embedder != self.embedder:
+            raise ValueError(f"store was embedded with {self.embedder} but queries would use {embedder}; "
+                             f"check EMBED_MODEL / USE_OPENAI / OPENAI_API_KEY or re-ingest")
+        if self.reducer is not None:
+            vecs = _project(vecs, self.reducer)
+        if vecs.shape[1] != self.dim:
+            raise ValueError(f"embeddings are {vecs.shape[1]}-dim but the store holds {self.dim}-dim vectors; "
+                             f"check EMBED_MODEL / USE_OPENAI or re-ingest")
+        return vecs
 
     def search(self, query: str, k: int = 5) -> List[Tuple[float, Dict]]:
         if len(self.meta) == 0: return []
-        qv = _embed_texts([query])[0]
-        sims = (self.vectors @ qv)  # normalized → cosine == dot
-        idx = np.argsort(-sims)[:k]
-        return [(float(sims[i]), self.meta[i]) for i in idx]
+        return self.search_vectors(self.embed([query]), k=k)[0]
+
+    def search_batch(self, queries: List[str], k: int = 5) -> List[List[Tuple[float, Dict]]]:
+        """One embedding call and one matrix-matrix product for all queries."""
+        if len(self.meta) == 0: return [[] for _ in queries]
+        return self.search_vectors(self.embed(queries), k=k)
+
+    def search_vectors(self, qvs: np.ndarray, k: int = 5) -> List[List[Tuple[float, Dict]]]:
+        """Top-k hits for each row of `qvs` (already embedded, normalized queries)."""
+        import numpy as np
+        if len(self.meta) == 0: return [[] for _ in range(len(qvs))]
+        sims = self.vectors @ qvs.T  # (n, nq); normalized → cosine == dot
+        out = []
+        for j in range(sims.shape[1]):
+            col = sims[:, j]
+            if k < len(col):
+                idx = np.argpartition(-col, k-1)[:k]
+                idx = idx[np.argsort(-col[idx])]
+            else:
+                idx = np.argsort(-col)
+            out.append([(float(col[i]), self.meta[i]) for i in idx])
+        return out
+
+# -------------------------
+# Segmented (append-only) store
+# -------------------------
+MANIFEST = "manifest.json"
+
+def _store_signature(store_dir: str) -> Tuple:
+    """Cheap change detector: stat of the manifest (or the legacy file pair)."""
+    sig = []
+    for fn in (MANIFEST, "vectors.npz", "meta.json"):
+        try:
+            st = os.stat(os.path.join(store_dir, fn))
+            sig.append((fn, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            pass
+    return tuple(sig)
+
+def _manifest_fingerprint(store_dir: str, man: Dict) -> str:
+    """Identity of a store's contents: its nonce plus the live segments and tombstones.
+
+    The nonce is drawn on every full rewrite and segment names only grow in between, so a
+    rebuilt or different store never shares a fingerprint even if its version number does.
+    Manifests written before the nonce existed fall back to the store's absolute path.
+    """
+    ident = {"store": man.get("nonce") or os.path.abspath(store_dir),
+             "segments": [s["name"] for s in man["segments"]], "tombstones": man["tombstones"]}
+    return hashlib.sha1(json.dumps(ident, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+def _write_json_atomic(path: str, obj):
+    tmp = f"{path}.tmp-{os.getpid()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+class SegmentedStore:
+    """LSM-style store directory: immutable segments + tombstones, tied together by manifest.json.
+
+    Writers never modify a segment; they write new files and then atomically replace the
+    manifest, so a reader always sees one consistent set of segments. One writer at a time.
+    A directory with only the legacy vectors.npz/meta.json pair is read as a single segment.
+
+    Tombstones map a chunk id to `next_segment` at delete time and hide that id only in
+    older segments, so re-ingesting a deleted source adds live rows without reviving the
+    deleted ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def manifest(self) -> Dict:
+        mp = os.path.join(self.path, MANIFEST)
+        if os.path.exists(mp):
+            with open(mp, "r", encoding="utf-8") as f:
+                man = json.load(f)
+            if isinstance(man["tombstones"], list):  # older manifests: a flat id list covering every segment
+                man["tombstones"] = dict.fromkeys(man["tombstones"], man["next_segment"])
+            return man
+        segments = []
+        if all(os.path.exists(os.path.join(self.path, fn)) for fn in ("vectors.npz", "meta.json")):
+            with open(os.path.join(self.path, "meta.json"), "r", encoding="utf-8") as f:
+                rows = len(json.load(f))
+            segments.append({"name": "legacy", "vectors": "vectors.npz", "meta": "meta.json", "rows": rows})
+        return {"version": 0, "next_segment": 1, "nonce": uuid.uuid4().hex, "segments": segments, "tombstones": {},
+                "dim": None, "embed_dim": None, "reducer": None, "embedder": None}
+
+    @staticmethod
+    def _seq(seg: Dict) -> int:
+        """Creation order of a segment: seg-000007 → 7; the legacy pair is 0."""
+        return int(seg["name"].rsplit("-", 1)[1]) if seg["name"].startswith("seg-") else 0
+
+    def _dead(self, man: Dict, seg: Dict) -> set:
+        """Ids hidden in `seg`: tombstones written after it was created."""
+        seq = self._seq(seg)
+        return {i for i, at in man["tombstones"].items() if seq < at}
+
+    @staticmethod
+    def _files(man: Dict) -> set:
+        files = {fn for s in man["segments"] for fn in (s["vectors"], s["meta"])}
+        if man.get("reducer"):
+            files.add(man["reducer"])
+        return files
+
+    def _check_dim(self, man: Dict, vectors: np.ndarray, what: str):
+        if man.get("dim") is not None and vectors.shape[1] != man["dim"]:
+            raise ValueError(f"{what} has {vectors.shape[1]}-dim vectors but {self.path} is {man['dim']}-dim")
+
+    def _read_meta(self, seg: Dict) -> List[Dict]:
+        with open(os.path.join(self.path, seg["meta"]), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read_vectors(self, seg: Dict, mmap: bool = False) -> np.ndarray:
+        """A segment's vectors; .npy segments can be memory-mapped, (legacy) .npz are read whole."""
+        import numpy as np
+        fp = os.path.join(self.path, seg["vectors"])
+        if fp.endswith(".npy"):
+            return np.load(fp, mmap_mode="r" if mmap else None)
+        with np.load(fp) as z:
+            return z["arr_0"]
+
+    def _read_segment(self, seg: Dict) -> Tuple[np.ndarray, List[Dict]]:
+        return self._read_vectors(seg), self._read_meta(seg)
+
+    def _read_reducer(self, man: Dict) -> Optional[Dict]:
+        import numpy as np
+        if not man.get("reducer"):
+            return None
+        with np.load(os.path.join(self.path, man["reducer"])) as z:
+            return {"mean": z["mean"], "components": z["components"]}
+
+    def _write_segment(self, manifest: Dict, vectors: np.ndarray, metas: List[Dict]) -> Dict:
+        import numpy as np
+        name = f"seg-{manifest['next_segment']:06d}"
+        manifest["next_segment"] += 1
+        # uncompressed, so searches can mmap the segment instead of decompressing it
+        np.save(os.path.join(self.path, name + ".npy"), np.asarray(vectors, dtype="float32"))
+        _write_json_atomic(os.path.join(self.path, name + ".json"), metas)
+        return {"name": name, "vectors": name + ".npy", "meta": name + ".json", "rows": len(metas)}
+
+    def _publish(self, manifest: Dict, old: Optional[Dict] = None) -> Dict:
+        manifest["version"] += 1
+        _write_json_atomic(os.path.join(self.path, MANIFEST), manifest)
+        if old:
+            # Segment files the new manifest no longer references; readers holding the old
+            # manifest retry against the new one if a file disappears under them.
+            live = self._files(manifest)
+            for fn in self._files(old) - live:
+                if os.path.exists(os.path.join(self.path, fn)):
+                    os.remove(os.path.join(self.path, fn))
+        return manifest
+
+    def load(self, retries: int = 3) -> "Store":
+        import numpy as np
+        for attempt in range(retries):
+            man = self.manifest()
+            try:
+                parts = [self._read_segment(s) for s in man["segments"]]
+                reducer = self._read_reducer(man)
+                break
+            except FileNotFoundError:
+                if attempt == retries - 1: raise
+        vecs, metas = [], []
+        for seg, (v, m) in zip(man["segments"], parts):
+            self._check_dim(man, v, f"segment {seg['name']}")
+            dead = self._dead(man, seg)
+            keep = [i for i, x in enumerate(m) if x["id"] not in dead]
+            vecs.append(v[keep] if len(keep) != len(m) else v)
+            metas.extend(m[i] for i in keep)
+        dim = man.get("dim") or EMBED_DIM or FALLBACK_DIM
+        vectors = np.concatenate(vecs, axis=0) if vecs else np.zeros((0, dim), dtype="float32")
+        return Store(vectors.astype("float32", copy=False), metas, version=man["version"],
+                     embed_dim=man.get("embed_dim"), reducer=reducer, embedder=man.get("embedder"),
+                     fingerprint=_manifest_fingerprint(self.path, man))
+
+    def append(self, vectors: np.ndarray, metas: List[Dict]) -> Dict:
+        """Add new chunks as one immutable segment."""
+        man = self.manifest()
+        if metas:
+            self._check_dim(man, vectors, "new segment")
+            # newer than every tombstone, so none of them hide these rows
+            man["segments"].append(self._write_segment(man, vectors, metas))
+        return self._publish(man)
+
+    def replace(self, vectors: np.ndarray, metas: List[Dict], embed_dim: Optional[int] = None,
+                reducer: Optional[Dict] = None, embedder: Optional[str] = None) -> Dict:
+        """Drop every segment and tombstone; publish `vectors`/`metas` as the only segment.
+
+        The manifest records the vector width (checked on every load/append), the width asked
+        of the embedder, which embedder produced them, and the PCA reducer file, if any.
+        """
+        import numpy as np
+        old = self.manifest()
+        man = {"version": old["version"], "next_segment": old["next_segment"], "nonce": uuid.uuid4().hex,
+               "segments": [], "tombstones": {},
+               "dim": int(vectors.shape[1]), "embed_dim": embed_dim, "reducer": None, "embedder": embedder}
+        if reducer is not None:
+            man["reducer"] = f"pca-{man['next_segment']:06d}.npz"
+            np.savez(os.path.join(self.path, man["reducer"]), **reducer)
+        man["segments"].append(self._write_segment(man, vectors, metas))
+        return self._publish(man, old=old)
+
+    def delete(self, ids: Optional[List[str]] = None, sources: Optional[List[str]] = None) -> int:
+        """Tombstone chunks by id and/or by source path; returns how many live chunks were deleted."""
+        man = self.manifest()
+        ids, srcs = set(ids or []), set(sources or [])
+        new = set()
+        for seg in man["segments"]:  # meta JSON only; vectors are not needed to find ids
+            dead = self._dead(man, seg)
+            new.update(m["id"] for m in self._read_meta(seg)
+                       if (m["id"] in ids or m["source"] in srcs) and m["id"] not in dead)
+        if new:
+            man["tombstones"].update(dict.fromkeys(new, man["next_segment"]))
+            self._publish(man)
+        return len(new)
+
+    def compact(self, max_rows: Optional[int] = None) -> Dict:
+        """Merge segments smaller than `max_rows` (all segments if None) into one, dropping tombstoned rows.
+
+        Segments not yet in the mappable .npy format (legacy vectors.npz, older seg-*.npz) are
+        always rewritten, so blocked_search can stream them.
+        """
+        import numpy as np
+        old = self.manifest()
+        small = [s for s in old["segments"]
+                 if max_rows is None or s["rows"] < max_rows or not s["vectors"].endswith(".npy")]
+        stale = any(not s["vectors"].endswith(".npy") for s in small)
+        if len(small) < 2 and not (small and (old["tombstones"] or stale)):
+            return old
+        vecs, metas = [], []
+        for seg in small:
+            v, m = self._read_segment(seg)
+            dead = self._dead(old, seg)
+            keep = [i for i, x in enumerate(m) if x["id"] not in dead]
+            vecs.append(v[keep])
+            metas.extend(m[i] for i in keep)
+        man = dict(old, segments=[s for s in old["segments"] if s not in small])
+        if metas:
+            # Merged segment takes the position of the oldest one, keeping row order stable
+            pos = old["segments"].index(small[0])
+            man["segments"].insert(pos, self._write_segment(man, np.concatenate(vecs, axis=0), metas))
+        # a tombstone is still needed while an unmerged segment it covers remains
+        rest = [self._seq(s) for s in old["segments"] if s not in small]
+        man["tombstones"] = {i: at for i, at in old["tombstones"].items() if any(q < at for q in rest)}
+        return self._publish(man, old=old)
 
 def _read_txt(path: str) -> str:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         return f.read()
 
 def _read_pdf(path: str) -> str:
+    from pypdf import PdfReader  # only ingest reads PDFs
     reader = PdfReader(path)
     out = []
     for p in reader.pages:
         out.append(p.extract_text() or "")
     return "\n".join(out)
 
-def _load_docs(data_dir: str) -> List[Tuple[str,str]]:
+def _load_docs(data_dir: str, skip: Optional[set] = None) -> List[Tuple[str,str]]:
+    """Read .txt/.pdf files under data_dir; `skip` holds source paths (relative to data_dir) to leave out."""
     docs = []
     for root, _, files in os.walk(data_dir):
         for fn in files:
             fp = os.path.join(root, fn)
+            if skip and os.path.relpath(fp, start=data_dir) in skip:
+                continue
             if fn.lower().endswith(".txt"):
                 docs.append((fp, _read_txt(fp)))
             elif fn.lower().endswith(".pdf"):
                 docs.append((fp, _read_pdf(fp)))
     return docs
 
-def build_store(data_dir: str, store_dir: str, chunk_size=900, overlap=150) -> 'Store':
-    docs = _load_docs(data_dir)
+def _chunk_docs(docs: List[Tuple[str,str]], data_dir: str, chunk_size=900, overlap=150) -> Tuple[List[Dict], List[str]]:
     metas, texts = [], []
     for src, raw in docs:
         text = _normalize_ws(raw)
         if not text: continue
-        chunks = _split_chunks(text, chunk_size=chunk_size, overlap=overlap)
-        off = 0
-        for ch in chunks:
-            begin = off
-            end = off + len(ch)
-            off = end
+        for begin, end in _chunk_spans(text, chunk_size=chunk_size, overlap=overlap):
+            ch = text[begin:end]
             metas.append({
                 "id": hashlib.md5((src+str(begin)).encode()).hexdigest()[:10],
                 "source": os.path.relpath(src, start=data_dir),
@@ -138,32 +453,182 @@ def build_store(data_dir: str, store_dir: str, chunk_size=900, overlap=150) -> '
                 "end": end
             })
             texts.append(ch)
+    return metas, texts
+
+def build_store(data_dir: str, store_dir: str, chunk_size=900, overlap=150, append=False,
+                dim: Optional[int] = EMBED_DIM, reduce: str = "api") -> 'Store':
+    """Build the store from data_dir.
+
+    With append=True only sources not already in the store are read and embedded (in the
+    store's existing vector space), and they are added as one new segment instead of
+    rewriting the store.
+
+    `dim` shrinks the vectors: reduce="api" asks the embedder for `dim`-wide embeddings,
+    reduce="pca" embeds at full width and projects onto the corpus's top `dim` principal
+    components (saved with the store and applied to queries too).
+    """
+    import numpy as np
+    if append:
+        seg = SegmentedStore(store_dir)
+        current = seg.load()
+        if current.meta:
+            known = {m["source"] for m in current.meta}
+            metas, texts = _chunk_docs(_load_docs(data_dir, skip=known), data_dir, chunk_size, overlap)
+            if texts:
+                seg.append(current.embed(texts), metas)
+            return seg.load()
+
+    metas, texts = _chunk_docs(_load_docs(data_dir), data_dir, chunk_size, overlap)
     if not texts:
-        store = Store(np.zeros((0,384), dtype="float32"), [])
+        store = Store(np.zeros((0, dim or FALLBACK_DIM), dtype="float32"), [])
         store.save(store_dir)
         return store
-    vecs = _embed_texts(texts)
-    store = Store(vecs, metas)
+    if reduce == "pca" and dim:
+        raw, embedder = _embed(texts)
+    else:
+        raw, embedder = _embed(texts, dim=dim)
+        if dim and raw.shape[1] != dim:
+            # only text-embedding-3 models honour `dimensions`; others return their native width
+            if raw.shape[1] < dim:
+                raise ValueError(f"{embedder} returns {raw.shape[1]}-dim embeddings; cannot reduce to {dim}")
+            print(f"[WARN] {embedder} returned {raw.shape[1]}-dim embeddings, not {dim} → reducing with PCA.")
+            reduce = "pca"
+    if reduce == "pca" and dim:
+        reducer = _fit_pca(raw, dim)
+        if reducer["components"].shape[1] < dim:
+            print(f"[WARN] PCA keeps {reducer['components'].shape[1]} dims (corpus rank) instead of {dim}.")
+        store = Store(_project(raw, reducer), metas, embed_dim=raw.shape[1], reducer=reducer, embedder=embedder)
+    else:
+        store = Store(raw, metas, embed_dim=raw.shape[1], embedder=embedder)
     store.save(store_dir)
     return store
 
+# -------------------------
+# Context packing
+# -------------------------
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "3000"))
+_MIN_TAIL_TOKENS = 50  # don't bother packing a truncated context shorter than this
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+@lru_cache(maxsize=1)
+def _token_encoder():
+    """tiktoken encoder for GEN_MODEL, or None (no tiktoken / encodings unavailable offline)."""
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(GEN_MODEL)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def _count_tokens(text: str) -> int:
+    enc = _token_encoder()
+    if enc is not None:
+        return len(enc.encode(text))
+    return len(_APPROX_TOKEN_RE.findall(text))
+
+def _truncate_tokens(text: str, n: int) -> str:
+    if n <= 0:
+        return ""
+    enc = _token_encoder()
+    if enc is not None:
+        return enc.decode(enc.encode(text)[:n])
+    toks = list(_APPROX_TOKEN_RE.finditer(text))
+    return text[:toks[n-1].end()] if len(toks) > n else text
+
+def _merge_hits(hits: List[Tuple[float, Dict]]) -> List[Dict]:
+    """Merge overlapping/adjacent hits of the same source using their char offsets.
+
+    Returns groups {"ranks": [...], "text": ...} ordered by best rank; ranks are 1-based
+    positions in `hits`. Overlaps are only spliced when the texts agree on the shared span,
+    so stores with stale offsets degrade to no merging rather than garbled text.
+    """
+    by_source: Dict[str, List[Tuple[int, Dict]]] = {}
+    for rank, (_, h) in enumerate(hits, 1):
+        by_source.setdefault(h["source"], []).append((rank, h))
+
+    groups: List[Dict] = []
+    for items in by_source.values():
+        items.sort(key=lambda x: (x[1]["begin"], x[1]["end"]))
+        cur = None
+        for rank, h in items:
+            if cur is not None:
+                off = h["begin"] - cur["begin"]
+                if h["begin"] < cur["end"]:
+                    n = min(len(cur["text"]) - off, len(h["chunk"]))
+                    if cur["text"][off:off+n] == h["chunk"][:n]:
+                        cur["text"] += h["chunk"][n:]
+                        cur["end"] = max(cur["end"], h["end"])
+                        cur["ranks"].append(rank)
+                        continue
+                elif h["begin"] == cur["end"] + 1:  # next word after a single space
+                    cur["text"] += " " + h["chunk"]
+                    cur["end"] = h["end"]
+                    cur["ranks"].append(rank)
+                    continue
+            cur = {"ranks": [rank], "text": h["chunk"], "begin": h["begin"], "end": h["end"]}
+            groups.append(cur)
+
+    # identical text under different sources (copies of one document) is sent once
+    out, seen = [], {}
+    for g in sorted(groups, key=lambda g: min(g["ranks"])):
+        if g["text"] in seen:
+            seen[g["text"]]["ranks"].extend(g["ranks"])
+            continue
+        seen[g["text"]] = g
+        out.append(g)
+    for g in out:
+        g["ranks"].sort()
+    return out
+
+def _pack_contexts(hits: List[Tuple[float, Dict]], max_tokens: int = CONTEXT_TOKENS) -> Tuple[List[str], List[str], Dict]:
+    """Merge hits and fit them into `max_tokens`.
+
+    Returns (labels, contexts, usage). Each label lists the hit ranks a context covers,
+    e.g. "[1][3]", so [n] citations keep pointing at `sources[n-1]`. usage separates
+    tokens removed by merging duplicates/overlaps from tokens cut to fit the budget.
+    """
+    groups = [(g, _count_tokens(g["text"])) for g in _merge_hits(hits) if g["text"].strip()]
+    labels, contexts, used = [], [], 0
+    for g, t in groups:
+        text = g["text"]
+        if used + t > max_tokens:
+            room = max_tokens - used
+            if room < _MIN_TAIL_TOKENS and contexts:
+                break
+            text = _truncate_tokens(text, room)
+            if not text.strip():
+                break
+            t = _count_tokens(text)
+        labels.append("".join(f"[{r}]" for r in g["ranks"]))
+        contexts.append(text)
+        used += t
+        if used >= max_tokens:
+            break
+    raw = sum(_count_tokens(h["chunk"]) for _, h in hits)
+    merged = sum(t for _, t in groups)
+    return labels, contexts, {"raw": raw, "merged": merged, "packed": used,
+                              "saved_by_merge": raw - merged, "cut_by_budget": merged - used}
+
 SYSTEM_PROMPT = """You are a concise assistant. Answer USING ONLY the provided context chunks.
 Cite sources as [n] for the provided chunk index. If not in the chunks, say you don't know.
 """
 
-def _llm_answer(question: str, contexts: List[str]) -> str:
+def _llm_answer(question: str, contexts: List[str], labels: Optional[List[str]] = None) -> str:
     use = os.getenv("USE_OPENAI", "auto").lower()
     key = os.getenv("OPENAI_API_KEY", "").strip()
 
     if use in ("never", "false", "0"):
         return (" ".join(contexts[:2])[:1200] if contexts else "I don't know.")
 
-    if OpenAI and key:
+    if key and _openai_cls():
         try:
-            client = OpenAI()
+            client = _openai_cls()()
+            labels = labels or [f"[{i+1}]" for i in range(len(contexts))]
             msgs = [
                 {"role":"system","content":SYSTEM_PROMPT},
-                {"role":"user","content": f"Question: {question}\n\nContext:\n" + "\n\n".join(f"[{i+1}] {c}" for i,c in enumerate(contexts))}
+                {"role":"user","content": f"Question: {question}\n\nContext:\n" + "\n\n".join(f"{lb} {c}" for lb,c in zip(labels, contexts))}
             ]
             resp = client.chat.completions.create(model=GEN_MODEL, messages=msgs, temperature=0.2)
             return resp.choices[0].message.content.strip()
@@ -173,18 +638,146 @@ def _llm_answer(question: str, contexts: List[str]) -> str:
     # Fallback: extractive (top chunks)
     return (" ".join(contexts[:2])[:1200] if contexts else "I don't know.")
 
-def answer(store: 'Store', q: str, k: int = 5) -> Dict:
-    hits = store.search(q, k=k)
-    contexts = [h[1]["chunk"] for h in hits]
-    answer_text = _llm_answer(q, contexts)
-    return {
+def answer(store: 'Store', q: str, k: int = 5, max_context_tokens: int = CONTEXT_TOKENS,
+           hits: Optional[List[Tuple[float, Dict]]] = None, qv: Optional[np.ndarray] = None,
+           cache=None) -> Dict:
+    """Retrieve, pack and generate.
+
+    Pass `hits` (and the query vector `qv`) when retrieval already happened, e.g. batched.
+    With an answer_cache.AnswerCache, a near-duplicate question against the same store
+    contents (Store.fingerprint), k and context budget returns the cached result instead
+    of generating.
+    """
+    t0 = time.perf_counter()
+    if cache is not None:
+        if qv is None:
+            qv = store.embed([q])[0]
+        ident = store.fingerprint or f"v{store.version}"  # in-memory stores have no fingerprint
+        scope = f"{ident}:k{k}:t{max_context_tokens}"
+        cached = cache.get(qv, scope)
+        if cached is not None:
+            return dict(cached["result"], question=q,
+                        cache={"hit": True, "similarity": cached["similarity"], "question": cached["question"]})
+    if hits is None:
+        hits = store.search_vectors(qv[None, :], k=k)[0] if qv is not None else store.search(q, k=k)
+    labels, contexts, usage = _pack_contexts(hits, max_tokens=max_context_tokens)
+    answer_text = _llm_answer(q, contexts, labels=labels)
+    res = {
         "question": q,
         "answer": answer_text,
         "sources": [
             {"rank": i+1, "score": float(score), "source": h["source"], "begin": h["begin"], "end": h["end"]}
             for i,(score,h) in enumerate(hits)
-        ]
+        ],
+        "context_tokens": usage,
     }
+    if cache is not None:
+        cache.put(qv, scope, q, res, seconds=time.perf_counter() - t0)
+        res["cache"] = {"hit": False}
+    return res
+
+# -------------------------
+# Warm daemon (rag.py serve / ask --socket)
+# -------------------------
+SOCKET_ENV = "RAG_SOCKET"
+
+class _AskServer:
+    """Keeps stores (and answer caches) loaded between questions; reloads a store when it changes."""
+
+    def __init__(self):
+        self._stores: Dict[str, Tuple[Tuple, Store]] = {}
+        self._caches: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def store(self, path: str) -> Store:
+        sig = _store_signature(path)
+        with self._lock:
+            hit = self._stores.get(path)
+            if hit is None or hit[0] != sig:
+                hit = (sig, Store.load(path))
+                self._stores[path] = hit
+            return hit[1]
+
+    def cache(self, path: Optional[str]):
+        if not path:
+            return None
+        with self._lock:
+            if path not in self._caches:
+                from answer_cache import AnswerCache
+                self._caches[path] = AnswerCache(path)
+            return self._caches[path]
+
+    def handle(self, req: Dict) -> Dict:
+        st = self.store(req["store"])
+        return answer(st, req["q"], k=req.get("k", 5),
+                      max_context_tokens=req.get("context_tokens", CONTEXT_TOKENS),
+                      cache=self.cache(req.get("cache")))
+
+    def close(self):
+        for c in self._caches.values():
+            c.flush()
+
+def serve(socket_path: str):
+    """Answer newline-delimited JSON requests on a Unix socket until interrupted."""
+    import signal, socket, socketserver
+    state = _AskServer()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    resp = {"ok": True, "result": state.handle(json.loads(line))}
+                except Exception as e:
+                    resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                self.wfile.write((json.dumps(resp) + "\n").encode("utf-8"))
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(socket_path):
+        try:  # refuse to steal a live daemon's socket; clear a stale one
+            with socket.socket(socket.AF_UNIX) as s:
+                s.connect(socket_path)
+            raise SystemExit(f"[SERVE] already running on {socket_path}")
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+    def _stop(*_):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _stop)
+    with Server(socket_path, Handler) as srv:
+        print(f"[SERVE] listening on {socket_path}", flush=True)
+        try:
+            srv.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(socket_path)
+            state.close()
+
+def _ask_daemon(socket_path: str, req: Dict, timeout: float = 600.0) -> Optional[Dict]:
+    """Forward one request to a running daemon; None when no daemon answers on the socket.
+
+    Any socket failure (refused, reset, broken pipe, timeout) also returns None, so the
+    caller answers in-process instead.
+    """
+    import socket
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX) as s:
+            s.settimeout(timeout)
+            s.connect(socket_path)
+            s.sendall((json.dumps(req) + "\n").encode("utf-8"))
+            with s.makefile("rb") as f:
+                resp = json.loads(f.readline())
+    except (ConnectionRefusedError, FileNotFoundError):
+        return None  # stale socket file, no daemon behind it
+    except (OSError, ValueError) as e:
+        print(f"[WARN] daemon on {socket_path} failed: {e or type(e).__name__} → answering locally.", file=sys.stderr)
+        return None
+    if not resp.get("ok"):
+        raise RuntimeError(f"daemon error: {resp.get('error')}")
+    return resp["result"]
 
 def main():
     ap = argparse.ArgumentParser(description="RAG minimal (cloud-friendly)")
@@ -195,20 +788,60 @@ def main():
     p_ing.add_argument("--store", default=STORE_DIR_DEFAULT)
     p_ing.add_argument("--chunk_size", type=int, default=900)
     p_ing.add_argument("--overlap", type=int, default=150)
+    p_ing.add_argument("--append", action="store_true", help="only add new sources, as a new segment")
+    p_ing.add_argument("--dim", type=int, default=EMBED_DIM, help="reduce vectors to this many dimensions")
+    p_ing.add_argument("--reduce", choices=["api", "pca"], default="api",
+                       help="api: request --dim from the embedder; pca: fit PCA on the corpus")
 
     p_ask = sub.add_parser("ask", help="ask a question against the store")
     p_ask.add_argument("--store", default=STORE_DIR_DEFAULT)
     p_ask.add_argument("--q", required=True)
     p_ask.add_argument("--k", type=int, default=5)
+    p_ask.add_argument("--context_tokens", type=int, default=CONTEXT_TOKENS, help="prompt budget for retrieved context")
+    p_ask.add_argument("--cache", default=os.getenv("RAG_ANSWER_CACHE"), help="semantic answer cache dir")
+    p_ask.add_argument("--socket", default=os.getenv(SOCKET_ENV), help="forward to a `rag.py serve` daemon if one is running")
+
+    p_srv = sub.add_parser("serve", help="warm daemon answering `ask --socket` requests")
+    p_srv.add_argument("--socket", default=os.getenv(SOCKET_ENV), required=not os.getenv(SOCKET_ENV))
+
+    p_cst = sub.add_parser("cache-stats", help="hit rate and time saved by the answer cache")
+    p_cst.add_argument("--cache", default=os.getenv("RAG_ANSWER_CACHE"), required=not os.getenv("RAG_ANSWER_CACHE"))
+
+    p_del = sub.add_parser("delete", help="tombstone chunks by source path and/or chunk id")
+    p_del.add_argument("--store", default=STORE_DIR_DEFAULT)
+    p_del.add_argument("--source", action="append", default=[])
+    p_del.add_argument("--id", action="append", default=[])
+
+    p_cmp = sub.add_parser("compact", help="merge small segments and purge tombstoned chunks")
+    p_cmp.add_argument("--store", default=STORE_DIR_DEFAULT)
+    p_cmp.add_argument("--max_rows", type=int, default=None, help="only merge segments smaller than this")
 
     args = ap.parse_args()
     if args.cmd == "ingest":
-        st = build_store(args.data, args.store, chunk_size=args.chunk_size, overlap=args.overlap)
-        print(f"[INGEST] chunks: {len(st.meta)} → {args.store}")
+        st = build_store(args.data, args.store, chunk_size=args.chunk_size, overlap=args.overlap,
+                         append=args.append, dim=args.dim, reduce=args.reduce)
+        print(f"[INGEST] chunks: {len(st.meta)} ({st.dim}-dim) → {args.store}")
+    elif args.cmd == "delete":
+        n = SegmentedStore(args.store).delete(ids=args.id, sources=args.source)
+        print(f"[DELETE] tombstoned: {n}")
+    elif args.cmd == "compact":
+        man = SegmentedStore(args.store).compact(max_rows=args.max_rows)
+        print(f"[COMPACT] segments: {len(man['segments'])} (version {man['version']})")
     elif args.cmd == "ask":
-        st = Store.load(args.store)
-        out = answer(st, args.q, k=args.k)
+        req = {"store": os.path.abspath(args.store), "q": args.q, "k": args.k,
+               "context_tokens": args.context_tokens,
+               "cache": os.path.abspath(args.cache) if args.cache else None}
+        out = _ask_daemon(args.socket, req)
+        if out is None:
+            local = _AskServer()
+            out = local.handle(req)
+            local.close()
         print(json.dumps(out, indent=2))
+    elif args.cmd == "serve":
+        serve(args.socket)
+    elif args.cmd == "cache-stats":
+        from answer_cache import AnswerCache
+        print(json.dumps(AnswerCache(args.cache).stats(), indent=2))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""Cold vs warm latency of `python rag.py ask`.
+
+cold: every call starts Python, imports, loads the store and answers in-process.
+warm: a `rag.py serve` daemon holds the store; each call only forwards over the socket.
+"""
+import os, sys, json, time, argparse, statistics, subprocess, tempfile
+
+def run_asks(store: str, questions, socket_path=None):
+    times = []
+    for q in questions:
+        cmd = [sys.executable, "rag.py", "ask", "--store", store, "--q", q]
+        if socket_path:
+            cmd += ["--socket", socket_path]
+        t0 = time.perf_counter()
+        subprocess.run(cmd, check=True, capture_output=True)
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+def summary(times):
+    times = sorted(times)
+    return {"n": len(times), "median_ms": round(statistics.median(times), 1),
+            "p90_ms": round(times[int(0.9 * (len(times) - 1))], 1), "max_ms": round(times[-1], 1)}
+
+def main():
+    ap = argparse.ArgumentParser(description="Measure cold vs warm rag.py ask latency")
+    ap.add_argument("--store", default="store")
+    ap.add_argument("--questions", default="questions.json")
+    ap.add_argument("--repeat", type=int, default=2)
+    args = ap.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f) * args.repeat
+    cold = run_asks(args.store, questions)
+
+    sock = os.path.join(tempfile.mkdtemp(), "rag.sock")
+    srv = subprocess.Popen([sys.executable, "rag.py", "serve", "--socket", sock], stdout=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 30
+        while not os.path.exists(sock):
+            if srv.poll() is not None or time.time() > deadline:
+                raise SystemExit("daemon did not start")
+            time.sleep(0.05)
+        run_asks(args.store, questions[:1], sock)  # first request loads the store
+        warm = run_asks(args.store, questions, sock)
+    finally:
+        srv.terminate()
+        srv.wait()
+
+    print(json.dumps({"cold": summary(cold), "warm": summary(warm)}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Recall and latency of reduced-dimension stores against the full-width store.
+
+Builds three stores from the same data: full width, `--dim` wide from the embedder
+("api": text-embedding-3 `dimensions`, or the fallback at that width) and full width
+projected by PCA to `--dim`. recall@k is the overlap of each store's top-k chunk ids with
+the full-width top-k for the same question; latency is per-query search (embed + score).
+
+    python scripts/bench_dim.py --data data --questions questions.json --dim 256
+"""
+import os, sys, json, time, argparse, statistics, tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from rag import build_store  # noqa: E402
+
+def top_ids(store, questions, k):
+    ids, times = [], []
+    for q in questions:
+        t0 = time.perf_counter()
+        hits = store.search(q, k=k)
+        times.append((time.perf_counter() - t0) * 1000)
+        ids.append([m["id"] for _, m in hits])
+    return ids, times
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare full-width, API-reduced and PCA-reduced stores")
+    ap.add_argument("--data", default="data")
+    ap.add_argument("--questions", default="questions.json")
+    ap.add_argument("--dim", type=int, default=256)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--chunk_size", type=int, default=800)
+    ap.add_argument("--overlap", type=int, default=120)
+    args = ap.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        questions = json.load(f)
+    tmp = tempfile.mkdtemp(prefix="bench-dim-")
+    variants = {"full": dict(dim=None), "api": dict(dim=args.dim, reduce="api"),
+                "pca": dict(dim=args.dim, reduce="pca")}
+    report, reference = {}, None
+    for name, kw in variants.items():
+        store = build_store(args.data, os.path.join(tmp, name), chunk_size=args.chunk_size,
+                            overlap=args.overlap, **kw)
+        store.search(questions[0], k=args.k)  # warm-up
+        ids, times = top_ids(store, questions, args.k)
+        reference = reference or ids
+        recall = statistics.mean(len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(ids, reference))
+        report[name] = {"dim": store.dim, "bytes": int(store.vectors.nbytes),
+                        f"recall@{args.k}": round(recall, 3),
+                        "median_ms": round(statistics.median(times), 2), "max_ms": round(max(times), 2)}
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
-import os, re, json, time, hashlib, argparse, datetime, pathlib, textwrap
+import os, re, json, time, hashlib, argparse, datetime, pathlib, textwrap, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
+from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 import feedparser
 
 # Optional text extraction if we fall back to HTML pages (non-PDF)
@@ -17,7 +20,11 @@ except Exception:
 DEFAULT_OUTDIR = "data/news"
 MAX_PER_RUN = int(os.getenv("NEWS_MAX_PER_RUN", "10"))
 REQUEST_TIMEOUT = 30
-SLEEP_BETWEEN = 0.6  # polite delay between requests
+MAX_WORKERS = int(os.getenv("NEWS_WORKERS", "4"))
+HOST_INTERVAL = float(os.getenv("NEWS_HOST_INTERVAL", "0.6"))  # polite delay between requests to the same host
+USER_AGENT = "rag-news-scraper/1.0"
+STREAM_CHUNK = 64 * 1024
+FEED_CACHE_DIR = "_feed_cache"  # under --outdir; ETag/Last-Modified + last body per feed URL
 
 # arXiv Atom search queries — focused around RAG / dense retrieval / ColBERT / FiD, etc.
 ARXIV_QUERIES = [
@@ -87,15 +94,141 @@ def pick_pdf_link(links) -> Optional[str]:
             return ln.get("href")
     return None
 
-def fetch_url(url: str) -> Optional[bytes]:
-    try:
-        resp = requests.get(url, timeout=REQUEST_TIMEOUT, headers={"User-Agent": "rag-news-scraper/1.0"})
-        if resp.status_code == 200:
-            return resp.content
-        print(f"[WARN] GET {url} -> {resp.status_code}")
-    except Exception as e:
-        print(f"[WARN] GET {url} failed: {e}")
-    return None
+# -------------------------
+# HTTP
+# -------------------------
+class HostRateLimiter:
+    """Spaces requests to the same host at least `interval` seconds apart (thread-safe)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next_slot: Dict[str, float] = {}
+
+    def wait(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, 0.0))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class Downloader:
+    """Pooled session + bounded worker pool; per-host rate limits instead of global sleeps."""
+
+    def __init__(self, workers: int = MAX_WORKERS, host_interval: float = HOST_INTERVAL,
+                 cache_dir: Optional[str] = None):
+        self.workers = max(1, workers)
+        self.limiter = HostRateLimiter(host_interval)
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=self.workers, pool_maxsize=self.workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.cache_dir = cache_dir
+        self._cache_index_path = os.path.join(cache_dir, "index.json") if cache_dir else None
+        self._cache_index: Dict[str, Dict] = load_json(self._cache_index_path, default={}) if cache_dir else {}
+        self._cache_lock = threading.Lock()
+
+    def get(self, url: str, **kw) -> requests.Response:
+        self.limiter.wait(url)
+        return self.session.get(url, timeout=REQUEST_TIMEOUT, **kw)
+
+    def map(self, fn, items) -> list:
+        """Run `fn` over `items` on the worker pool, keeping input order."""
+        with ThreadPoolExecutor(max_workers=self.workers) as ex:
+            return list(ex.map(fn, items))
+
+    def fetch_bytes(self, url: str) -> Optional[bytes]:
+        try:
+            resp = self.get(url)
+            if resp.status_code == 200:
+                return resp.content
+            print(f"[WARN] GET {url} -> {resp.status_code}")
+        except Exception as e:
+            print(f"[WARN] GET {url} failed: {e}")
+        return None
+
+    def download(self, url: str, dest: str, magic: Optional[bytes] = None) -> bool:
+        """Stream `url` into a temp file next to `dest`, then rename it into place.
+
+        With `magic`, the file is only kept if it starts with those bytes (e.g. b"%PDF").
+        """
+        tmp = None
+        try:
+            with self.get(url, stream=True) as resp:
+                if resp.status_code != 200:
+                    print(f"[WARN] GET {url} -> {resp.status_code}")
+                    return False
+                fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest) or ".", prefix=".part-")
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in resp.iter_content(chunk_size=STREAM_CHUNK):
+                        f.write(chunk)
+            if magic:
+                with open(tmp, "rb") as f:
+                    if f.read(len(magic)) != magic:
+                        return False
+            os.replace(tmp, dest)
+            tmp = None
+            return True
+        except Exception as e:
+            print(f"[WARN] GET {url} failed: {e}")
+            return False
+        finally:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def fetch_feed(self, url: str):
+        """Parse a feed, revalidating the cached copy with ETag / If-Modified-Since."""
+        with self._cache_lock:
+            cached = dict(self._cache_index.get(url) or {})
+        body_path = os.path.join(self.cache_dir, cached["file"]) if (self.cache_dir and cached.get("file")) else None
+        headers = {}
+        if body_path and os.path.exists(body_path):
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        body = None
+        try:
+            resp = self.get(url, headers=headers)
+            if resp.status_code == 304 and headers:
+                print(f"[CACHE] not modified: {url}")
+            elif resp.status_code == 200:
+                body = resp.content
+                self._store_feed(url, body, resp.headers)
+            else:
+                print(f"[WARN] GET {url} -> {resp.status_code}")
+        except Exception as e:
+            print(f"[WARN] GET {url} failed: {e}")
+
+        if body is None and body_path and os.path.exists(body_path):
+            with open(body_path, "rb") as f:
+                body = f.read()
+        return feedparser.parse(body or b"")
+
+    def _store_feed(self, url: str, body: bytes, headers):
+        if not self.cache_dir:
+            return
+        ensure_dir(self.cache_dir)
+        name = hashlib.md5(url.encode()).hexdigest()[:16] + ".xml"
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".part-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        os.replace(tmp, os.path.join(self.cache_dir, name))
+        with self._cache_lock:
+            self._cache_index[url] = {
+                "file": name,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+            }
+
+    def save_cache(self):
+        if self._cache_index_path:
+            with self._cache_lock:
+                save_json(self._cache_index_path, self._cache_index)
 
 def extract_text_from_html(content: bytes) -> str:
     if trafilatura:
@@ -120,36 +253,40 @@ def extract_text_from_html(content: bytes) -> str:
 # -------------------------
 # Sources
 # -------------------------
-def fetch_arxiv_items() -> List[Dict]:
+def _arxiv_entries(dl: Downloader, q: str) -> List[Dict]:
+    url = ARXIV_ENDPOINT.format(query=q)
+    print(f"[SRC] arXiv: {url}")
     out: List[Dict] = []
-    for q in ARXIV_QUERIES:
-        url = ARXIV_ENDPOINT.format(query=q)
-        print(f"[SRC] arXiv: {url}")
-        feed = feedparser.parse(url)
-        for e in feed.entries:
-            title = e.get("title", "")
-            summary = e.get("summary", "")
-            if not (good_keyword_hit(title) or good_keyword_hit(summary)):
-                continue
-            pdf_url = pick_pdf_link(e.get("links"))
-            page_url = e.get("link")  # abstract page
-            pubdate = e.get("updated") or e.get("published") or ""
-            out.append({
-                "source": "arxiv",
-                "title": title.strip(),
-                "summary": summary.strip(),
-                "page_url": page_url,
-                "pdf_url": pdf_url,
-                "date": pubdate,
-                "id": e.get("id", page_url),
-            })
-        time.sleep(SLEEP_BETWEEN)
+    feed = dl.fetch_feed(url)
+    for e in feed.entries:
+        title = e.get("title", "")
+        summary = e.get("summary", "")
+        if not (good_keyword_hit(title) or good_keyword_hit(summary)):
+            continue
+        pdf_url = pick_pdf_link(e.get("links"))
+        page_url = e.get("link")  # abstract page
+        pubdate = e.get("updated") or e.get("published") or ""
+        out.append({
+            "source": "arxiv",
+            "title": title.strip(),
+            "summary": summary.strip(),
+            "page_url": page_url,
+            "pdf_url": pdf_url,
+            "date": pubdate,
+            "id": e.get("id", page_url),
+        })
+    return out
+
+def fetch_arxiv_items(dl: Downloader) -> List[Dict]:
+    out: List[Dict] = []
+    for entries in dl.map(lambda q: _arxiv_entries(dl, q), ARXIV_QUERIES):
+        out.extend(entries)
     return out
 
-def fetch_acl_items() -> List[Dict]:
+def fetch_acl_items(dl: Downloader) -> List[Dict]:
     print(f"[SRC] ACL: {ACL_RSS}")
     out: List[Dict] = []
-    feed = feedparser.parse(ACL_RSS)
+    feed = dl.fetch_feed(ACL_RSS)
     for e in feed.entries:
         title = e.get("title", "")
         summary = e.get("summary", "")
@@ -168,14 +305,56 @@ def fetch_acl_items() -> List[Dict]:
         })
     return out
 
+def save_item(dl: Downloader, it: Dict, day_dir: str, today: str) -> Dict:
+    title = it["title"]
+    page_url = it.get("page_url")
+    pdf_url = it.get("pdf_url")
+    base = slugify(title) or hashlib.md5((page_url or pdf_url or title).encode()).hexdigest()[:12]
+    meta = {
+        "title": title,
+        "source": it["source"],
+        "date": it.get("date"),
+        "page_url": page_url,
+        "pdf_url": pdf_url,
+        "saved_at": today,
+        "files": {},
+    }
+
+    if pdf_url:
+        # stream PDF straight to disk
+        pdf_path = os.path.join(day_dir, f"{base}.pdf")
+        if dl.download(pdf_url, pdf_path, magic=b"%PDF"):
+            meta["files"]["pdf"] = os.path.relpath(pdf_path)
+            print(f"[SAVE] PDF -> {pdf_path}")
+        else:
+            print(f"[WARN] PDF fetch failed or not a PDF: {pdf_url}")
+
+    if not meta["files"]:
+        # fallback: fetch abstract/page HTML and store as .txt
+        if page_url:
+            html = dl.fetch_bytes(page_url)
+            if html:
+                text = extract_text_from_html(html)
+                if text:
+                    txt_path = os.path.join(day_dir, f"{base}.txt")
+                    with open(txt_path, "w", encoding="utf-8") as f:
+                        f.write(textwrap.dedent(text).strip())
+                    meta["files"]["txt"] = os.path.relpath(txt_path)
+                    print(f"[SAVE] TXT -> {txt_path}")
+                else:
+                    print(f"[WARN] Could not extract text from {page_url}")
+    return meta
+
 # -------------------------
 # Main scrape+save
 # -------------------------
-def main():
+def main(argv: Optional[List[str]] = None):
     ap = argparse.ArgumentParser(description="Weekly RAG news scraper (10 new items)")
     ap.add_argument("--outdir", default=DEFAULT_OUTDIR)
     ap.add_argument("--limit", type=int, default=MAX_PER_RUN)
-    args = ap.parse_args()
+    ap.add_argument("--workers", type=int, default=MAX_WORKERS)
+    ap.add_argument("--host_interval", type=float, default=HOST_INTERVAL)
+    args = ap.parse_args(argv)
 
     today = datetime.date.today().isoformat()
     day_dir = os.path.join(args.outdir, today)
@@ -184,10 +363,14 @@ def main():
     seen_path = os.path.join(args.outdir, "_seen_urls.json")
     seen = set(load_json(seen_path, default=[]))
 
+    dl = Downloader(workers=args.workers, host_interval=args.host_interval,
+                    cache_dir=os.path.join(args.outdir, FEED_CACHE_DIR))
+
     # Gather candidates
     items = []
-    items.extend(fetch_arxiv_items())
-    items.extend(fetch_acl_items())
+    items.extend(fetch_arxiv_items(dl))
+    items.extend(fetch_acl_items(dl))
+    dl.save_cache()
 
     # Sort newest first (arXiv “updated” is ISO8601-ish, but for safety just reverse collected order)
     # We’ll keep relative order: arXiv queries newest first already; ACL feed is newest first.
@@ -219,48 +402,8 @@ def main():
     manifest = load_json(manifest_path, default={"generated_at": "", "batches": []})
 
     saved_entries = []
-    for it in new_items:
-        title = it["title"]
-        page_url = it.get("page_url")
-        pdf_url = it.get("pdf_url")
-        base = slugify(title) or hashlib.md5((page_url or pdf_url or title).encode()).hexdigest()[:12]
-        meta = {
-            "title": title,
-            "source": it["source"],
-            "date": it.get("date"),
-            "page_url": page_url,
-            "pdf_url": pdf_url,
-            "saved_at": today,
-            "files": {},
-        }
-
-        if pdf_url:
-            # download PDF
-            pdf_bytes = fetch_url(pdf_url)
-            if pdf_bytes and pdf_bytes.startswith(b"%PDF"):
-                pdf_path = os.path.join(day_dir, f"{base}.pdf")
-                with open(pdf_path, "wb") as f:
-                    f.write(pdf_bytes)
-                meta["files"]["pdf"] = os.path.relpath(pdf_path)
-                print(f"[SAVE] PDF -> {pdf_path}")
-            else:
-                print(f"[WARN] PDF fetch failed or not a PDF: {pdf_url}")
-
-        if not meta["files"]:
-            # fallback: fetch abstract/page HTML and store as .txt
-            if page_url:
-                html = fetch_url(page_url)
-                if html:
-                    text = extract_text_from_html(html)
-                    if text:
-                        txt_path = os.path.join(day_dir, f"{base}.txt")
-                        with open(txt_path, "w", encoding="utf-8") as f:
-                            f.write(textwrap.dedent(text).strip())
-                        meta["files"]["txt"] = os.path.relpath(txt_path)
-                        print(f"[SAVE] TXT -> {txt_path}")
-                    else:
-                        print(f"[WARN] Could not extract text from {page_url}")
-
+    metas = dl.map(lambda it: save_item(dl, it, day_dir, today), new_items)
+    for it, meta in zip(new_items, metas):
         # only mark seen if we saved something useful
         if meta["files"]:
             saved_entries.append(meta)
@@ -268,8 +411,6 @@ def main():
             if seen_key:
                 seen.add(seen_key)
 
-        time.sleep(SLEEP_BETWEEN)
-
     if not saved_entries:
         print("[INFO] Found new candidates, but none saved successfully.")
         return 0
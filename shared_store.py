@@ -0,0 +1,200 @@
+"""Serve one in-memory copy of the store to many API workers.
+
+The parent process loads the store once and writes it into a single file on tmpfs
+(/dev/shm): vectors, then a row-offset table and the JSON-encoded meta rows. A small
+pointer file names the current file. Workers mmap it read-only, so vectors and meta are
+shared pages, never per-worker copies.
+
+Swaps: the parent writes generation N+1, atomically replaces the pointer, then unlinks
+generation N. Every worker checks the pointer (one stat) per request, so all of them move
+to N+1 from their next request on; requests already running finish on the N mapping,
+which the kernel keeps alive until they drop it.
+
+    python shared_store.py serve --store store --workers 4 --port 8000
+"""
+import os, json, mmap, time, argparse, tempfile, threading
+from collections.abc import Sequence
+from typing import Dict, Optional, Tuple
+import numpy as np
+from rag import Store, STORE_DIR_DEFAULT, _store_signature, _write_json_atomic
+
+POINTER_ENV = "RAG_SHM_POINTER"
+SHM_DIR_DEFAULT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+def _align8(n: int) -> int:
+    return (n + 7) & ~7
+
+class SharedMeta(Sequence):
+    """Read-only meta rows decoded on access from the shared block."""
+
+    def __init__(self, offsets: np.ndarray, blob: memoryview):
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0: i += len(self)
+        if not 0 <= i < len(self): raise IndexError(i)
+        return json.loads(bytes(self._blob[self._offsets[i]:self._offsets[i+1]]))
+
+def write_block(store: Store, path: str) -> Dict:
+    """Lay the store out in one file: float32 vectors | int64 offsets | meta JSON blob."""
+    vecs = np.ascontiguousarray(store.vectors, dtype="float32")
+    rows = [json.dumps(m, ensure_ascii=False).encode("utf-8") for m in store.meta]
+    offsets = np.zeros(len(rows) + 1, dtype="int64")
+    np.cumsum([len(r) for r in rows], out=offsets[1:])
+    off_at = _align8(vecs.nbytes)
+    blob_at = off_at + offsets.nbytes
+    with open(path, "wb") as f:
+        f.write(vecs.tobytes())
+        f.write(b"\0" * (off_at - vecs.nbytes))
+        f.write(offsets.tobytes())
+        for r in rows:
+            f.write(r)
+    return {"rows": len(rows), "dim": int(vecs.shape[1]), "offsets_at": off_at,
+            "blob_at": blob_at, "blob_bytes": int(offsets[-1])}
+
+def attach_block(path: str, info: Dict, version: int = 0) -> Store:
+    """Map a block written by write_block; the returned Store shares its pages (read-only).
+
+    `info` also carries the store's embedding settings (embed_dim, embedder and the PCA
+    reducer file) so queries are embedded into the same space as in the parent, and its
+    content fingerprint.
+    """
+    reducer = None
+    if info.get("reducer"):
+        with np.load(info["reducer"]) as z:
+            reducer = {"mean": z["mean"], "components": z["components"]}
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    rows, dim = info["rows"], info["dim"]
+    vectors = np.frombuffer(mm, dtype="float32", count=rows * dim).reshape(rows, dim)
+    offsets = np.frombuffer(mm, dtype="int64", count=rows + 1, offset=info["offsets_at"])
+    blob = memoryview(mm)[info["blob_at"]:info["blob_at"] + info["blob_bytes"]]
+    return Store(vectors, SharedMeta(offsets, blob), version=version, embed_dim=info.get("embed_dim"),
+                 reducer=reducer, embedder=info.get("embedder"), fingerprint=info.get("fingerprint"))
+
+class SharedStorePublisher:
+    """Parent side: loads the store, publishes generations, swaps on change."""
+
+    def __init__(self, store_dir: str = STORE_DIR_DEFAULT, shm_dir: str = SHM_DIR_DEFAULT):
+        self.store_dir = store_dir
+        self.shm_dir = shm_dir
+        self.prefix = f"rag-{os.getpid()}"
+        self.pointer_path = os.path.join(shm_dir, f"{self.prefix}.json")
+        self.generation = 0
+        self._current: Tuple[str, ...] = ()
+        self._signature: Tuple = ()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def publish(self) -> Dict:
+        with self._lock:
+            signature = _store_signature(self.store_dir)
+            store = Store.load(self.store_dir)
+            gen = self.generation + 1
+            path = os.path.join(self.shm_dir, f"{self.prefix}-{gen}.bin")
+            info = write_block(store, path)
+            files = (path,)
+            reducer_path = None
+            if store.reducer is not None:
+                reducer_path = path[:-len(".bin")] + ".reducer.npz"
+                np.savez(reducer_path, **store.reducer)
+                files += (reducer_path,)
+            pointer = dict(info, generation=gen, path=path, version=store.version, embed_dim=store.embed_dim,
+                           embedder=store.embedder, reducer=reducer_path, fingerprint=store.fingerprint)
+            _write_json_atomic(self.pointer_path, pointer)
+            # Workers switch on their next request; mapped pages outlive the unlink.
+            for p in self._current:
+                if os.path.exists(p):
+                    os.remove(p)
+            self.generation, self._current, self._signature = gen, files, signature
+            print(f"[SHM] generation {gen}: {info['rows']} chunks → {path}")
+            return pointer
+
+    def refresh(self) -> bool:
+        """Republish if the store directory changed since the last publish."""
+        if _store_signature(self.store_dir) == self._signature:
+            return False
+        self.publish()
+        return True
+
+    def watch(self, interval: float = 5.0) -> threading.Thread:
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[WARN] store refresh failed: {e}")
+        t = threading.Thread(target=loop, name="shm-watch", daemon=True)
+        t.start()
+        return t
+
+    def close(self):
+        self._stop.set()
+        for p in self._current + (self.pointer_path,):
+            if os.path.exists(p):
+                os.remove(p)
+
+class SharedStoreClient:
+    """Worker side: attaches to the current generation, following swaps."""
+
+    def __init__(self, pointer_path: str):
+        self.pointer_path = pointer_path
+        self._stamp = None
+        self._store: Optional[Store] = None
+        self.generation = 0
+        self._lock = threading.Lock()
+
+    def store(self, retries: int = 3) -> Store:
+        st = os.stat(self.pointer_path)
+        stamp = (st.st_ino, st.st_mtime_ns)  # pointer is replaced, never rewritten in place
+        if stamp == self._stamp and self._store is not None:
+            return self._store
+        with self._lock:
+            for attempt in range(retries):
+                with open(self.pointer_path, "r", encoding="utf-8") as f:
+                    ptr = json.load(f)
+                if ptr["generation"] == self.generation and self._store is not None:
+                    break
+                try:
+                    self._store = attach_block(ptr["path"], ptr, version=ptr.get("version", 0))
+                    self.generation = ptr["generation"]
+                    break
+                except FileNotFoundError:
+                    # swapped again between reading the pointer and opening the block
+                    if attempt == retries - 1: raise
+                    time.sleep(0.01)
+            self._stamp = stamp
+            return self._store
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve the RAG API from a shared-memory store")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_srv = sub.add_parser("serve", help="publish the store to shared memory and run uvicorn workers")
+    p_srv.add_argument("--store", default=os.getenv("STORE_DIR", STORE_DIR_DEFAULT))
+    p_srv.add_argument("--shm_dir", default=SHM_DIR_DEFAULT)
+    p_srv.add_argument("--workers", type=int, default=4)
+    p_srv.add_argument("--host", default="0.0.0.0")
+    p_srv.add_argument("--port", type=int, default=8000)
+    p_srv.add_argument("--watch", type=float, default=5.0, help="seconds between store change checks (0 = off)")
+    args = ap.parse_args()
+
+    import uvicorn
+    pub = SharedStorePublisher(args.store, shm_dir=args.shm_dir)
+    pub.publish()
+    os.environ[POINTER_ENV] = pub.pointer_path
+    if args.watch > 0:
+        # uvicorn's supervisor claims every signal, so swaps are driven by the store dir
+        pub.watch(args.watch)
+    try:
+        uvicorn.run("app:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        pub.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os, shutil
+import numpy as np
+import rag
+from rag import build_store, answer, Store
+from answer_cache import AnswerCache
+
+def _unit(v):
+    v = np.asarray(v, dtype="float32")
+    return v / np.linalg.norm(v)
+
+def test_paraphrase_hits_within_scope(tmp_path, monkeypatch):
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("Contoso builds secure Microsoft 365 solutions.", encoding="utf-8")
+    st = build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+
+    base = rag._hash_vec("Summarize the key points.")
+    near = {"Summarize the key points.": base,
+            "What are the main findings?": _unit(base + 0.05 * rag._hash_vec("noise"))}
+    real = rag._embed
+    monkeypatch.setattr(rag, "_embed", lambda texts, dim=None: (
+        np.stack([near.get(t, real([t], dim)[0][0]) for t in texts]), rag.HASH_EMBEDDER))
+    calls = []
+    monkeypatch.setattr(rag, "_llm_answer", lambda q, ctx, labels=None: calls.append(q) or "generated")
+
+    cache = AnswerCache(str(tmp_path/"cache"), threshold=0.95)
+    first = answer(st, "Summarize the key points.", k=3, cache=cache)
+    second = answer(st, "What are the main findings?", k=3, cache=cache)
+    assert calls == ["Summarize the key points."]
+    assert first["cache"] == {"hit": False} and second["cache"]["hit"]
+    assert second["question"] == "What are the main findings?" and second["sources"] == first["sources"]
+
+    answer(st, "What are the main findings?", k=2, cache=cache)  # different k → miss
+    shutil.rmtree(tmp_path/"store")
+    rebuilt = build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+    assert rebuilt.version == st.version and rebuilt.fingerprint != st.fingerprint
+    answer(rebuilt, "What are the main findings?", k=3, cache=cache)  # rebuilt store → miss
+    assert len(calls) == 3
+    assert Store.load(str(tmp_path/"store")).fingerprint == rebuilt.fingerprint
+
+    cache.flush()
+    stats = AnswerCache(str(tmp_path/"cache")).stats()  # persisted across instances
+    assert stats["hits"] == 1 and stats["misses"] == 3 and stats["hit_rate"] == 0.25
+
+def test_processes_merge_instead_of_overwriting(tmp_path):
+    path = str(tmp_path/"cache")
+    a, b = AnswerCache(path, threshold=0.99), AnswerCache(path, threshold=0.99)
+    va, vb = rag._hash_vec("question a"), rag._hash_vec("question b")
+    assert a.get(va, "s") is None and not os.path.exists(path)  # lookups don't write
+    a.put(va, "s", "question a", {"answer": "A"}, seconds=2.0)
+    b.put(vb, "s", "question b", {"answer": "B"}, seconds=3.0)  # merges a's entry and miss
+    assert b.get(va, "s")["result"] == {"answer": "A"}
+    b.flush()
+
+    fresh = AnswerCache(path)
+    assert fresh.stats()["entries"] == 2
+    assert fresh.stats()["hits"] == 1 and fresh.stats()["misses"] == 1 and fresh.stats()["saved_seconds"] == 2.0
+
+def test_ttl_and_size_eviction():
+    now = [1000.0]
+    cache = AnswerCache(threshold=0.99, ttl=60, max_entries=2, clock=lambda: now[0])
+    vs = [rag._hash_vec(f"q{i}") for i in range(3)]
+    for i, v in enumerate(vs):
+        cache.put(v, "s", f"q{i}", {"answer": str(i)}, seconds=1.0)
+        now[0] += 1
+    assert cache.get(vs[0], "s") is None  # least recently used, evicted
+    assert cache.get(vs[2], "s")["result"] == {"answer": "2"}
+    now[0] += 120
+    assert cache.get(vs[2], "s") is None and cache.stats()["entries"] == 0
@@ -0,0 +1,80 @@
+import os, json
+import numpy as np
+import pytest
+from rag import build_store, Store, SegmentedStore, _embed_texts
+from blocked_search import BlockedSearcher, main
+
+def _ids(hits):
+    return [m["id"] for _, m in hits]
+
+def test_matches_in_memory_search(tmp_path):
+    data = tmp_path/"data"
+    store = tmp_path/"store"
+    os.makedirs(data, exist_ok=True)
+    for d in range(3):
+        (data/f"d{d}.txt").write_text(" ".join(f"t{d}_{i}" for i in range(120)), encoding="utf-8")
+    build_store(str(data), str(store), chunk_size=20, overlap=5)
+    (data/"late.txt").write_text(" ".join(f"late{i}" for i in range(120)), encoding="utf-8")
+    build_store(str(data), str(store), chunk_size=20, overlap=5, append=True)
+    SegmentedStore(str(store)).delete(sources=["d1.txt"])
+
+    man = SegmentedStore(str(store)).manifest()
+    assert len(man["segments"]) == 2 and all(s["vectors"].endswith(".npy") for s in man["segments"])
+    total = sum(s["rows"] for s in man["segments"])
+
+    mem = Store.load(str(store))
+    queries = ["t1_5 t1_6", "late3 late4", "t0_100", "nothing in particular"]
+    bs = BlockedSearcher(str(store), block_rows=7, workers=3)
+    for k in (1, 4, total + 5):
+        blocked = bs.search_batch(queries, k=k)
+        for q, hits in zip(queries, blocked):
+            expected = mem.search(q, k=k)
+            assert _ids(hits) == _ids(expected)
+            assert [s for s, _ in hits] == pytest.approx([s for s, _ in expected], abs=1e-5)
+            assert all(m["source"] != "d1.txt" for _, m in hits)  # tombstoned
+
+    st = bs.last_stats
+    assert st["rows"] == total and st["queries"] == len(queries) and st["workers"] == 3
+    assert st["blocks"] == sum(-(-s["rows"] // 7) for s in man["segments"])
+    assert st["rows_per_s"] > 0 and st["mb_per_s"] >= 0
+
+def test_legacy_npz_and_empty_store(tmp_path):
+    assert BlockedSearcher(str(tmp_path/"empty")).search("anything") == []
+
+    legacy = tmp_path/"legacy"
+    os.makedirs(legacy)
+    metas = [{"id": f"c{i}", "source": "old.txt", "chunk": f"old chunk {i}", "begin": 0, "end": 11} for i in range(9)]
+    np.savez_compressed(legacy/"vectors.npz", _embed_texts([m["chunk"] for m in metas]))
+    (legacy/"meta.json").write_text(json.dumps(metas), encoding="utf-8")
+
+    hits = BlockedSearcher(str(legacy), block_rows=4, workers=2).search("old chunk 3", k=3)
+    assert _ids(hits) == _ids(Store.load(str(legacy)).search("old chunk 3", k=3))
+    assert hits[0][1]["id"] == "c3"
+
+def test_cli_reports_throughput(tmp_path, capsys):
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("Contoso builds secure Microsoft 365 solutions. " * 10, encoding="utf-8")
+    build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+
+    main(["--store", str(tmp_path/"store"), "--q", "Contoso", "--q", "secure", "--k", "2",
+          "--block_rows", "3", "--workers", "2"])
+    out = json.loads(capsys.readouterr().out)
+    assert [len(r["hits"]) for r in out["results"]] == [2, 2]
+    assert out["stats"]["block_rows"] == 3 and out["stats"]["rows"] > 0
+
+def test_compact_rewrites_legacy_store_as_npy(tmp_path):
+    legacy = tmp_path/"legacy"
+    os.makedirs(legacy)
+    metas = [{"id": f"c{i}", "source": "old.txt", "chunk": f"old chunk {i}", "begin": 0, "end": 11} for i in range(5)]
+    np.savez_compressed(legacy/"vectors.npz", _embed_texts([m["chunk"] for m in metas]))
+    (legacy/"meta.json").write_text(json.dumps(metas), encoding="utf-8")
+    before = Store.load(str(legacy)).search("old chunk 2", k=3)
+
+    man = SegmentedStore(str(legacy)).compact(max_rows=1)  # one segment, no tombstones: still rewritten
+    seg = man["segments"][0]
+    assert len(man["segments"]) == 1 and seg["vectors"].endswith(".npy")
+    assert not (legacy/"vectors.npz").exists()
+    assert isinstance(SegmentedStore(str(legacy))._read_vectors(seg, mmap=True), np.memmap)
+    assert _ids(BlockedSearcher(str(legacy)).search("old chunk 2", k=3)) == _ids(before)
+    assert SegmentedStore(str(legacy)).compact()["version"] == man["version"]  # nothing left to do
@@ -0,0 +1,53 @@
+import os, sys, json, time, subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _ask(store, sock=None):
+    cmd = [sys.executable, "rag.py", "ask", "--store", str(store), "--q", "What does Contoso build?", "--k", "2"]
+    if sock:
+        cmd += ["--socket", str(sock)]
+    p = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True, env=dict(os.environ, USE_OPENAI="never"))
+    assert p.returncode == 0, p.stderr
+    return p.stdout
+
+def test_ask_via_daemon_matches_local(tmp_path):
+    from rag import build_store
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    (data/"doc.txt").write_text("Contoso builds secure Microsoft 365 solutions. " * 10, encoding="utf-8")
+    build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+    sock = tmp_path/"rag.sock"
+
+    assert _ask(tmp_path/"store", sock) == _ask(tmp_path/"store")  # no daemon yet → local fallback
+
+    srv = subprocess.Popen([sys.executable, "rag.py", "serve", "--socket", str(sock)], cwd=ROOT,
+                           env=dict(os.environ, USE_OPENAI="never"), stdout=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            if sock.exists(): break
+            time.sleep(0.05)
+        out = _ask(tmp_path/"store", sock)
+        assert out == _ask(tmp_path/"store")
+        assert json.loads(out)["sources"]
+
+        # the client path answers through the daemon without importing the heavy modules
+        probe = ("import sys, runpy; sys.argv = ['rag.py', 'ask', '--store', sys.argv[1], '--q', 'x', '--socket', sys.argv[2]];"
+                 "runpy.run_path('rag.py', run_name='__main__');"
+                 "assert not {'numpy', 'pypdf', 'openai'} & set(sys.modules), sorted(sys.modules)")
+        p = subprocess.run([sys.executable, "-c", probe, str(tmp_path/"store"), str(sock)], cwd=ROOT,
+                           capture_output=True, text=True)
+        assert p.returncode == 0, p.stderr
+    finally:
+        srv.terminate()
+        srv.wait(timeout=10)
+    assert not sock.exists()
+
+def test_unresponsive_daemon_falls_back(tmp_path):
+    import socket
+    from rag import _ask_daemon
+    sock = tmp_path/"hung.sock"
+    with socket.socket(socket.AF_UNIX) as srv:
+        srv.bind(str(sock))
+        srv.listen(1)  # accepts the connection but never answers
+        assert _ask_daemon(str(sock), {"q": "x"}, timeout=0.2) is None
+    assert _ask_daemon(str(sock), {"q": "x"}) is None  # socket file left behind, nobody listening
@@ -0,0 +1,88 @@
+import os, asyncio, threading
+import pytest
+import rag
+from rag import build_store
+from microbatch import QueryBatcher
+
+def test_concurrent_queries_share_batches(tmp_path, monkeypatch):
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text(" ".join(f"word{i}" for i in range(400)), encoding="utf-8")
+    st = build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+
+    calls = []
+    real = rag._embed
+    monkeypatch.setattr(rag, "_embed", lambda texts, dim=None: calls.append(len(texts)) or real(texts, dim))
+
+    queries = [f"question {i}" for i in range(10)]
+    batcher = QueryBatcher(lambda: st, window_ms=50, max_batch=4)
+
+    async def run():
+        return await asyncio.gather(*(batcher.search(q, k=1 + i % 3) for i, q in enumerate(queries)))
+
+    results = asyncio.run(run())
+    assert calls == [4, 4, 2]
+    for i, (q, hits) in enumerate(zip(queries, results)):
+        single = st.search(q, k=1 + i % 3)
+        assert [h["id"] for _, h in hits] == [h["id"] for _, h in single]
+        assert [s for s, _ in hits] == pytest.approx([s for s, _ in single], abs=1e-5)
+
+    stats = batcher.stats()
+    assert stats["requests"] == 10 and stats["batches"] == 3
+    assert stats["batch_sizes"] == {2: 1, 4: 2}
+    assert stats["max_queue_delay_ms"] >= stats["avg_queue_delay_ms"] > 0
+
+def test_scoring_error_with_queued_requests_does_not_hang(tmp_path):
+    def broken_store():
+        raise RuntimeError("store unavailable")
+    batcher = QueryBatcher(broken_store, window_ms=1, max_batch=2)
+
+    async def run():
+        return await asyncio.gather(*(batcher.search(f"q{i}") for i in range(7)), return_exceptions=True)
+
+    def run_and_fail_fast():
+        async def first_error():
+            await asyncio.gather(*(batcher.search(f"q{i}") for i in range(7)))
+        with pytest.raises(RuntimeError):
+            asyncio.run(first_error())  # leaves requests queued; asyncio.run must still return
+
+    outcome = []
+    t = threading.Thread(target=lambda: outcome.append(asyncio.run(run())) or run_and_fail_fast())
+    t.start()
+    t.join(timeout=20)
+    assert not t.is_alive()
+    assert len(outcome[0]) == 7 and all(isinstance(r, RuntimeError) for r in outcome[0])
+
+def test_close_cancels_pending_requests(tmp_path):
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("some words " * 40, encoding="utf-8")
+    st = build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+    batcher = QueryBatcher(lambda: st, window_ms=10_000, max_batch=100)
+
+    async def run():
+        pending = [asyncio.ensure_future(batcher.search(f"q{i}")) for i in range(3)]
+        await asyncio.sleep(0.05)  # all three are collected, waiting for the window
+        await batcher.close()
+        done = await asyncio.gather(*pending, return_exceptions=True)
+        assert all(isinstance(r, asyncio.CancelledError) for r in done)
+        batcher.window = 0.0
+        return await batcher.search("after close")  # a new task starts on demand
+
+    assert asyncio.run(run())
+
+def test_embed_search_returns_the_store_it_scored(tmp_path):
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("some words " * 40, encoding="utf-8")
+    old = build_store(str(data), str(tmp_path/"old"), chunk_size=20, overlap=5)
+    new = build_store(str(data), str(tmp_path/"new"), chunk_size=20, overlap=5)
+    stores = iter([old, new])
+    batcher = QueryBatcher(lambda: next(stores), window_ms=1)
+
+    async def run():
+        searched, qv, hits = await batcher.embed_search("words", k=2)
+        return searched, hits
+
+    searched, hits = asyncio.run(run())
+    assert searched is old and hits and searched.fingerprint != new.fingerprint
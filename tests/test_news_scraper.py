@@ -0,0 +1,104 @@
+import os, json, time, threading, importlib.util
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+_SPEC = importlib.util.spec_from_file_location(
+    "news_scraper", os.path.join(os.path.dirname(__file__), "..", "scripts", "news_scraper.py"))
+news_scraper = importlib.util.module_from_spec(_SPEC)
+_SPEC.loader.exec_module(news_scraper)
+
+PDF = b"%PDF-1.4\n" + b"x" * 200_000
+ETAG = '"feed-v1"'
+
+def _atom(base):
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <entry>
+    <id>{base}/abs/1</id>
+    <title>Retrieval-Augmented Generation for Testing</title>
+    <summary>A RAG paper.</summary>
+    <updated>2025-01-01T00:00:00Z</updated>
+    <link href="{base}/abs/1" rel="alternate" type="text/html"/>
+    <link title="pdf" href="{base}/pdf/1.pdf" rel="related" type="application/pdf"/>
+  </entry>
+</feed>""".encode()
+
+class _Handler(BaseHTTPRequestHandler):
+    hits = []
+
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):
+        self.hits.append((self.path, self.headers.get("If-None-Match")))
+        base = f"http://{self.headers['Host']}"
+        if self.path.startswith("/feed"):
+            if self.headers.get("If-None-Match") == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = _atom(base)
+            self.send_response(200)
+            self.send_header("ETag", ETAG)
+        elif self.path.startswith("/pdf/"):
+            body = PDF
+            self.send_response(200)
+        else:
+            body = b"not found"
+            self.send_response(404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+@pytest.fixture
+def server(monkeypatch):
+    _Handler.hits = []
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{srv.server_address[1]}"
+    monkeypatch.setattr(news_scraper, "ARXIV_QUERIES", ["all:rag", "all:self-rag"])
+    monkeypatch.setattr(news_scraper, "ARXIV_ENDPOINT", base + "/feed?q={query}")
+    monkeypatch.setattr(news_scraper, "ACL_RSS", base + "/acl.rss")
+    yield base
+    srv.shutdown()
+
+def test_scrape_streams_pdf_into_place(server, tmp_path):
+    outdir = tmp_path/"news"
+    assert news_scraper.main(["--outdir", str(outdir), "--workers", "3", "--host_interval", "0"]) == 0
+
+    pdfs = list(outdir.rglob("*.pdf"))
+    assert len(pdfs) == 1 and pdfs[0].read_bytes() == PDF
+    assert not list(outdir.rglob(".part-*"))
+    manifest = json.loads((outdir/"manifest.json").read_text())
+    assert manifest["batches"][0]["count"] == 1
+
+def test_feed_revalidates_with_etag(server, tmp_path):
+    dl = news_scraper.Downloader(workers=2, host_interval=0, cache_dir=str(tmp_path/"cache"))
+    url = server + "/feed?q=x"
+    assert len(dl.fetch_feed(url).entries) == 1
+    dl.save_cache()
+
+    dl2 = news_scraper.Downloader(workers=2, host_interval=0, cache_dir=str(tmp_path/"cache"))
+    assert len(dl2.fetch_feed(url).entries) == 1  # served from cache on 304
+    assert _Handler.hits[-1] == ("/feed?q=x", ETAG)
+
+def test_host_rate_limiter_spaces_same_host_only():
+    limiter = news_scraper.HostRateLimiter(0.2)
+    done = {}
+
+    def call(name, url):
+        limiter.wait(url)
+        done[name] = time.monotonic()
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=call, args=(f"a{i}", f"http://a.example/{i}")) for i in range(3)]
+    threads.append(threading.Thread(target=call, args=("b", "http://b.example/x")))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    a = sorted(done[f"a{i}"] for i in range(3))
+    assert a[1] - a[0] >= 0.19 and a[2] - a[1] >= 0.19  # one slot per interval on a.example
+    assert done["b"] - start < 0.1                       # another host is not held up
@@ -1,5 +1,8 @@
 import os, json
-from rag import build_store, Store, answer
+import numpy as np
+import pytest
+import rag
+from rag import build_store, Store, SegmentedStore, answer, _pack_contexts, _truncate_tokens, _fit_pca, _project, _embed_texts
 
 def test_end_to_end(tmp_path):
     data = tmp_path/"data"
@@ -13,3 +16,148 @@ def test_end_to_end(tmp_path):
 
     res = answer(Store.load(str(store)), "What does Contoso build?", k=3)
     assert "Contoso" in json.dumps(res)
+
+def test_append_delete_compact(tmp_path, monkeypatch):
+    data = tmp_path/"data"
+    store = tmp_path/"store"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("Alpha document about governance. " * 20, encoding="utf-8")
+    build_store(str(data), str(store), chunk_size=20, overlap=5)
+    base = SegmentedStore(str(store)).manifest()
+    n_a = len(Store.load(str(store)).meta)
+
+    (data/"b.txt").write_text("Beta document about sharing. " * 20, encoding="utf-8")
+    st = build_store(str(data), str(store), chunk_size=20, overlap=5, append=True)
+    man = SegmentedStore(str(store)).manifest()
+    assert man["segments"][0] == base["segments"][0]  # existing segment untouched
+    assert len(man["segments"]) == 2 and man["version"] == base["version"] + 1
+    assert {m["source"] for m in st.meta} == {"a.txt", "b.txt"}
+
+    with monkeypatch.context() as mp:
+        mp.setattr(np, "load", lambda *a, **kw: pytest.fail("delete should only read segment meta"))
+        assert SegmentedStore(str(store)).delete(sources=["b.txt"]) > 0
+    st = Store.load(str(store))
+    assert len(st.meta) == n_a == len(st.vectors)
+    assert all(s["source"] == "a.txt" for _, s in st.search("Beta sharing", k=50))
+
+    man = SegmentedStore(str(store)).compact()
+    assert len(man["segments"]) == 1 and man["tombstones"] == {}
+    assert sorted(os.listdir(store)) == ["manifest.json", man["segments"][0]["meta"], man["segments"][0]["vectors"]]
+    assert len(Store.load(str(store)).meta) == n_a
+
+def test_reingest_deleted_source_keeps_old_rows_dead(tmp_path):
+    data = tmp_path/"data"
+    store = tmp_path/"store"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("Apples are red. " * 5, encoding="utf-8")
+    (data/"b.txt").write_text("Bananas are yellow. " * 5, encoding="utf-8")
+    build_store(str(data), str(store), chunk_size=20, overlap=5)
+
+    assert SegmentedStore(str(store)).delete(sources=["b.txt"]) > 0
+    (data/"b.txt").write_text("Cherries are dark. " * 5, encoding="utf-8")  # same chunk offsets → same ids
+    st = build_store(str(data), str(store), chunk_size=20, overlap=5, append=True)
+    b_chunks = [m["chunk"] for m in st.meta if m["source"] == "b.txt"]
+    assert b_chunks and all("Cherries" in c for c in b_chunks)
+    assert not any("Bananas" in m["chunk"] for m in st.meta)
+
+    assert SegmentedStore(str(store)).delete(sources=["b.txt"]) == len(b_chunks)  # the new rows
+    assert SegmentedStore(str(store)).delete(sources=["b.txt"]) == 0
+    man = SegmentedStore(str(store)).compact(max_rows=len(b_chunks) + 1)  # merges only the new segment
+    assert set(man["tombstones"]) == {m["id"] for m in st.meta if m["source"] == "b.txt"}
+    assert {m["source"] for m in Store.load(str(store)).meta} == {"a.txt"}
+    assert SegmentedStore(str(store)).compact()["tombstones"] == {}
+    assert {m["source"] for m in Store.load(str(store)).meta} == {"a.txt"}
+
+def _many_docs(data, n=6):
+    os.makedirs(data, exist_ok=True)
+    for d in range(n):
+        (data/f"d{d}.txt").write_text(" ".join(f"t{d}_{i}" for i in range(60)), encoding="utf-8")
+
+def test_dim_recorded_and_validated(tmp_path):
+    _many_docs(tmp_path/"data")
+    store = tmp_path/"store"
+    st = build_store(str(tmp_path/"data"), str(store), chunk_size=20, overlap=5, dim=64)
+    man = SegmentedStore(str(store)).manifest()
+    assert st.dim == man["dim"] == man["embed_dim"] == 64 and man["embedder"] == "hash"
+    loaded = Store.load(str(store))
+    assert loaded.embed(["q"]).shape == (1, 64) and loaded.search("t0_3", k=2)
+
+    with pytest.raises(ValueError):
+        SegmentedStore(str(store)).append(np.zeros((1, 32), dtype="float32"),
+                                          [{"id": "x", "source": "x", "chunk": "", "begin": 0, "end": 0}])
+    man["embedder"] = "openai:text-embedding-3-small"
+    (store/"manifest.json").write_text(json.dumps(man))
+    with pytest.raises(ValueError, match="embedded with openai"):
+        Store.load(str(store)).search("q")
+    man["dim"] = 128
+    (store/"manifest.json").write_text(json.dumps(man))
+    with pytest.raises(ValueError, match="64-dim"):
+        Store.load(str(store))
+
+def test_fit_pca_and_project():
+    rs = np.random.RandomState(0)
+    x = rs.randn(50, 2) @ rs.randn(2, 16)  # rank-2 data in 16 dims
+    red = _fit_pca(x, 2)
+    assert red["components"].shape == (16, 2)
+    np.testing.assert_allclose(red["components"].T @ red["components"], np.eye(2), atol=1e-5)
+    y = _project(x, red)
+    np.testing.assert_allclose(np.linalg.norm(y, axis=1), 1.0, atol=1e-5)
+    # the centred data lies in the kept subspace, so cosines survive the projection
+    c = x - x.mean(axis=0)
+    c /= np.linalg.norm(c, axis=1, keepdims=True)
+    np.testing.assert_allclose(y @ y.T, c @ c.T, atol=1e-4)
+    assert _fit_pca(x[:3], 8)["components"].shape == (16, 3)  # at most as many as rows
+
+def test_pca_store_projects_queries_and_appends(tmp_path):
+    _many_docs(tmp_path/"data")
+    store = tmp_path/"store"
+    build_store(str(tmp_path/"data"), str(store), chunk_size=20, overlap=5, dim=4, reduce="pca")
+    man = SegmentedStore(str(store)).manifest()
+    assert man["dim"] == 4 and man["embed_dim"] == 384 and (store/man["reducer"]).exists()
+
+    st = Store.load(str(store))
+    expected = _project(_embed_texts(["some query"], dim=384), st.reducer)
+    np.testing.assert_allclose(st.embed(["some query"]), expected, atol=1e-6)
+
+    (tmp_path/"data"/"new.txt").write_text("fresh words " * 30, encoding="utf-8")
+    st = build_store(str(tmp_path/"data"), str(store), chunk_size=20, overlap=5, append=True)
+    assert st.dim == 4 and "new.txt" in {m["source"] for m in st.meta}
+    assert SegmentedStore(str(store)).manifest()["reducer"] == man["reducer"]
+
+def test_api_reduce_falls_back_to_pca_when_dim_is_ignored(tmp_path, monkeypatch, capsys):
+    _many_docs(tmp_path/"data")
+    # an embedder without `dimensions` support: always its native width
+    monkeypatch.setattr(rag, "_embed", lambda texts, dim=None: (rag._embed_fallback(texts), rag.HASH_EMBEDDER))
+    st = build_store(str(tmp_path/"data"), str(tmp_path/"store"), chunk_size=20, overlap=5, dim=16, reduce="api")
+    assert "reducing with PCA" in capsys.readouterr().out
+    assert st.dim == 16 and st.reducer is not None and st.embed_dim == 384
+    assert Store.load(str(tmp_path/"store")).search("t2_10", k=3)
+
+    with pytest.raises(ValueError, match="cannot reduce to 1000"):
+        build_store(str(tmp_path/"data"), str(tmp_path/"wide"), chunk_size=20, overlap=5, dim=1000)
+
+def test_pack_contexts_merges_overlaps_and_keeps_citations(tmp_path):
+    data = tmp_path/"data"
+    os.makedirs(data, exist_ok=True)
+    words = " ".join(f"w{i}" for i in range(60))
+    (data/"doc.txt").write_text(words, encoding="utf-8")
+    st = build_store(str(data), str(tmp_path/"store"), chunk_size=20, overlap=5)
+    for m in st.meta:
+        assert words[m["begin"]:m["end"]] == m["chunk"]
+
+    # hits out of document order, plus an unrelated source
+    other = {"source": "other.txt", "chunk": "unrelated text", "begin": 0, "end": 14}
+    hits = [(0.9, st.meta[1]), (0.8, other), (0.7, st.meta[0]), (0.6, st.meta[2])]
+    labels, contexts, usage = _pack_contexts(hits, max_tokens=10_000)
+    assert labels == ["[1][3][4]", "[2]"]
+    assert contexts[0] == words[st.meta[0]["begin"]:st.meta[2]["end"]]
+    assert usage["saved_by_merge"] > 0 and usage["cut_by_budget"] == 0
+    assert usage["packed"] == usage["merged"] == usage["raw"] - usage["saved_by_merge"]
+
+    labels, contexts, usage = _pack_contexts(hits, max_tokens=30)
+    assert labels == ["[1][3][4]"] and usage["packed"] <= 30
+    assert usage["cut_by_budget"] > 0 and usage["packed"] == usage["merged"] - usage["cut_by_budget"]
+
+    assert _truncate_tokens("some text here", 0) == ""
+    assert _pack_contexts(hits, max_tokens=0)[1] == []
+    assert _pack_contexts([(0.9, dict(other, chunk="  "))])[1] == []
@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from rag import build_store, SegmentedStore, _embed_texts
+from shared_store import SharedStorePublisher, SharedStoreClient
+
+def test_workers_attach_and_follow_swaps(tmp_path):
+    data = tmp_path/"data"
+    store = tmp_path/"store"
+    os.makedirs(data, exist_ok=True)
+    (data/"a.txt").write_text("Contoso builds secure Microsoft 365 solutions. " * 10, encoding="utf-8")
+    local = build_store(str(data), str(store), chunk_size=20, overlap=5)
+
+    pub = SharedStorePublisher(str(store), shm_dir=str(tmp_path))
+    try:
+        pub.publish()
+        client = SharedStoreClient(pub.pointer_path)
+        shared = client.store()
+        assert not shared.vectors.flags.writeable and not shared.vectors.flags.owndata
+        np.testing.assert_array_equal(shared.vectors, local.vectors)
+        assert list(shared.meta) == local.meta
+        assert shared.search("What does Contoso build?", k=3) == local.search("What does Contoso build?", k=3)
+        assert client.store() is shared  # no re-attach while the pointer is unchanged
+        assert shared.fingerprint == local.fingerprint
+
+        assert not pub.refresh()
+        SegmentedStore(str(store)).append(_embed_texts(["new chunk"]),
+                                          [{"id": "x1", "source": "b.txt", "chunk": "new chunk", "begin": 0, "end": 9}])
+        assert pub.refresh()
+        swapped = client.store()
+        assert client.generation == 2 and len(swapped.meta) == len(local.meta) + 1
+        assert swapped.meta[-1]["id"] == "x1" and swapped.fingerprint != shared.fingerprint
+        # the old mapping stays readable for requests still holding it
+        assert len(shared.meta) == len(local.meta) and float(shared.vectors.sum()) == float(local.vectors.sum())
+        assert len([p for p in os.listdir(tmp_path) if p.endswith(".bin")]) == 1
+    finally:
+        pub.close()
+
+def test_workers_embed_queries_like_the_parent(tmp_path):
+    data = tmp_path/"data"
+    store = tmp_path/"store"
+    os.makedirs(data, exist_ok=True)
+    for d in range(4):
+        (data/f"d{d}.txt").write_text(" ".join(f"w{d}_{i}" for i in range(60)), encoding="utf-8")
+    local = build_store(str(data), str(store), chunk_size=20, overlap=5, dim=4, reduce="pca")
+
+    pub = SharedStorePublisher(str(store), shm_dir=str(tmp_path))
+    try:
+        pub.publish()
+        shared = SharedStoreClient(pub.pointer_path).store()
+        assert shared.dim == 4 and shared.embed_dim == local.embed_dim and shared.embedder == local.embedder
+        np.testing.assert_allclose(shared.embed(["w1_7 w1_8"]), local.embed(["w1_7 w1_8"]), atol=1e-6)
+        assert shared.search("w1_7 w1_8", k=3) == local.search("w1_7 w1_8", k=3)
+    finally:
+        pub.close()
+    assert not [p for p in os.listdir(tmp_path) if p.endswith(".npz")]
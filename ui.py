@@ -30,6 +30,10 @@ if st.button("🧠 Ask") and q.strip():
     res = answer(st_store, q, k=k)
     st.subheader("Answer")
     st.write(res["answer"])
+    ct = res.get("context_tokens") or {}
+    if ct:
+        st.caption(f"Context tokens: {ct['packed']} sent, {ct['saved_by_merge']} saved by merging, "
+                   f"{ct['cut_by_budget']} cut to fit the budget")
 
     st.subheader("Sources")
     if not res["sources"]: